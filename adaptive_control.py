@@ -0,0 +1,129 @@
+"""
+Controller umpan balik per kamera dengan dua sinyal, masing-masing untuk knob
+yang benar-benar memengaruhinya:
+
+- latensi inferensi (delay + jitter per batch, p90) vs LATENCY_BUDGET_MS: hanya
+  imgsz yang menurunkannya; skip rate tidak mengubah durasi satu inferensi.
+- lag producer (rata-rata durasi satu iterasi producer) vs interval frame
+  1/MAX_FPS: skip rate (lebih sedikit frame yang diinferensi) lalu kualitas JPEG
+  (encode lebih murah) menurunkannya.
+
+Saat ada headroom di kedua sinyal, dikembalikan dengan urutan terbalik.
+"""
+
+import os
+import time
+from collections import deque
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfigurasi
+ADAPTIVE_CONTROL = os.getenv("ADAPTIVE_CONTROL", "false").lower() == "true"
+LATENCY_BUDGET_MS = float(os.getenv("LATENCY_BUDGET_MS", "200"))
+ADAPTIVE_MAX_SKIP = int(os.getenv("ADAPTIVE_MAX_SKIP", "15"))
+ADAPTIVE_MIN_IMGSZ = int(os.getenv("ADAPTIVE_MIN_IMGSZ", "320"))
+ADAPTIVE_MIN_QUALITY = int(os.getenv("ADAPTIVE_MIN_QUALITY", "50"))
+ADAPTIVE_COOLDOWN = float(os.getenv("ADAPTIVE_COOLDOWN", "3"))  # detik antar keputusan
+ADAPTIVE_WINDOW = int(os.getenv("ADAPTIVE_WINDOW", "30"))  # jumlah sampel inferensi
+ADAPTIVE_HEADROOM = 0.6  # naikkan kualitas hanya jika p90 < 60% budget
+STREAM_JPEG_QUALITY = int(os.getenv("STREAM_JPEG_QUALITY", "95"))
+
+IMGSZ_STEP = 32  # YOLO butuh kelipatan stride 32
+QUALITY_STEP = 10
+
+
+class AdaptiveController:
+    def __init__(self, skip_rate, imgsz, jpeg_quality=STREAM_JPEG_QUALITY, budget_ms=LATENCY_BUDGET_MS,
+                 frame_interval_ms=100.0, max_skip=ADAPTIVE_MAX_SKIP, min_imgsz=ADAPTIVE_MIN_IMGSZ,
+                 min_quality=ADAPTIVE_MIN_QUALITY, cooldown=ADAPTIVE_COOLDOWN, window=ADAPTIVE_WINDOW):
+        self.base_skip_rate = self.skip_rate = skip_rate
+        self.max_imgsz = self.imgsz = imgsz
+        self.max_quality = self.jpeg_quality = jpeg_quality
+        self.budget_ms = budget_ms
+        self.frame_interval_ms = frame_interval_ms
+        self.max_skip = max(max_skip, skip_rate)
+        self.min_imgsz = min(min_imgsz, imgsz)
+        self.min_quality = min(min_quality, jpeg_quality)
+        self.cooldown = cooldown
+        self._samples = deque(maxlen=window)
+        self._loop_samples = deque(maxlen=window)
+        self._last_change = 0.0
+        self.decisions = deque(maxlen=20)
+
+    def observe(self, delay_ms, jitter_ms, now=None):
+        """Tambahkan satu sampel inferensi lalu evaluasi apakah setting perlu diubah."""
+        self._samples.append(delay_ms + jitter_ms)
+        return self._evaluate(now)
+
+    def observe_loop(self, loop_ms, now=None):
+        """Tambahkan durasi satu iterasi producer (termasuk frame yang tidak diinferensi)."""
+        self._loop_samples.append(loop_ms)
+        return self._evaluate(now)
+
+    def _evaluate(self, now=None):
+        now = now if now is not None else time.time()
+        if len(self._samples) < min(5, self._samples.maxlen) or now - self._last_change < self.cooldown:
+            return None
+        p90 = self.p90()
+        loop_ms = self.loop_ms()
+        over_latency = p90 > self.budget_ms
+        lagging = loop_ms > self.frame_interval_ms
+        if over_latency or lagging:
+            change = self._degrade(over_latency, lagging)
+        elif p90 < self.budget_ms * ADAPTIVE_HEADROOM and loop_ms < self.frame_interval_ms * ADAPTIVE_HEADROOM:
+            change = self._upgrade()
+        else:
+            change = None
+        if change:
+            self._last_change = now
+            # Sampel lama berasal dari setting sebelumnya
+            self._samples.clear()
+            self._loop_samples.clear()
+            self.decisions.append({"time": now, "p90_ms": round(p90, 1), "loop_ms": round(loop_ms, 1),
+                                   "change": change})
+        return change
+
+    def p90(self):
+        return float(np.percentile(self._samples, 90)) if self._samples else 0.0
+
+    def loop_ms(self):
+        return float(np.mean(self._loop_samples)) if self._loop_samples else 0.0
+
+    def _degrade(self, over_latency, lagging):
+        if over_latency and self.imgsz > self.min_imgsz:
+            self.imgsz = max(self.min_imgsz, self.imgsz - 2 * IMGSZ_STEP)
+            return f"imgsz -> {self.imgsz}"
+        if lagging and self.skip_rate < self.max_skip:
+            self.skip_rate = min(self.max_skip, self.skip_rate + max(1, self.skip_rate // 2))
+            return f"skip_rate -> {self.skip_rate}"
+        if lagging and self.jpeg_quality > self.min_quality:
+            self.jpeg_quality = max(self.min_quality, self.jpeg_quality - QUALITY_STEP)
+            return f"jpeg_quality -> {self.jpeg_quality}"
+        return None
+
+    def _upgrade(self):
+        if self.jpeg_quality < self.max_quality:
+            self.jpeg_quality = min(self.max_quality, self.jpeg_quality + QUALITY_STEP)
+            return f"jpeg_quality -> {self.jpeg_quality}"
+        if self.skip_rate > self.base_skip_rate:
+            self.skip_rate -= 1
+            return f"skip_rate -> {self.skip_rate}"
+        if self.imgsz < self.max_imgsz:
+            self.imgsz = min(self.max_imgsz, self.imgsz + IMGSZ_STEP)
+            return f"imgsz -> {self.imgsz}"
+        return None
+
+    def state(self):
+        return {
+            "skip_rate": self.skip_rate,
+            "imgsz": self.imgsz,
+            "jpeg_quality": self.jpeg_quality,
+            "budget_ms": self.budget_ms,
+            "p90_ms": round(self.p90(), 1),
+            "frame_interval_ms": self.frame_interval_ms,
+            "loop_ms": round(self.loop_ms(), 1),
+            "samples": len(self._samples),
+            "decisions": list(self.decisions),
+        }
@@ -1,12 +1,20 @@
-from flask import Flask, Response, render_template, jsonify, request, session, redirect, url_for, make_response
-from ultralytics import YOLO
-import cv2, time, logging
-from database import insert_detection, update_device, get_dashboard_data, get_detection_image
+from flask import Flask, Response, render_template, jsonify, request, session, redirect, url_for, make_response, send_file
+import time, logging, queue, atexit, threading, json
+from datetime import datetime, timedelta
+from werkzeug.http import http_date
+from database import get_dashboard_data_cached, check_database, get_cache_stats, get_detection_image, get_detection_image_key, get_detection_clip_key, get_pool_stats, get_detection_history, HISTORY_BUCKETS
+from image_store import ImageCache, get_image_path, get_thumbnail, make_thumbnail, image_key
+from clip_recorder import get_clip_path, CLIP_MIMETYPES
+from export_detections import export_rows, export_fields, iter_ndjson, iter_csv, EXPORT_MIMETYPES, IMAGE_MODES
 import bcrypt
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-from camera_capture import open_capture, reconnect_camera, capture_frame
+from pipeline import DetectionPipeline, load_camera_sources, OVERLAY_MODE, PIPELINE_MODE
+from inference import load_model, person_class_ids, warmup
+from startup import Startup, PRELOAD_MODEL, STARTUP_DEFER
+from workers import ProcessPipeline, PROCESS_MODE_AVAILABLE
+from metrics import REGISTRY
 
 # ==========================
 # Konfigurasi
@@ -15,11 +23,9 @@ load_dotenv()
 ESP32_STREAM_URL = os.getenv("ESP32_STREAM_URL")
 MODEL_PATH = os.getenv("MODEL_PATH", "best.pt")
 DEVICE_ID = int(os.getenv("DEVICE_ID", "1"))
-SKIP_RATE = int(os.getenv("SKIP_RATE", "5"))
-MAX_FPS = int(os.getenv("MAX_FPS", "10"))
-
-last_delay = None      # untuk delay/jitter
-last_db_insert = 0     # untuk rate limit DB insert
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "5000"))  # batas limit per halaman /api/history
+# Rentang default /api/history jika start tidak diberikan
+HISTORY_DEFAULT_SPAN = {"minute": timedelta(hours=6), "hour": timedelta(days=7), "day": timedelta(days=90)}
 
 # ==========================
 # Inisialisasi
@@ -30,6 +36,8 @@ app.config.update(
     SESSION_COOKIE_SECURE=os.getenv('SESSION_COOKIE_SECURE', 'false').lower() == 'true',  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY=True,
     SESSION_COOKIE_SAMESITE='Lax',
+    # Serahkan pengiriman file snapshot ke nginx/apache (X-Sendfile) jika tersedia
+    USE_X_SENDFILE=os.getenv('USE_X_SENDFILE', 'false').lower() == 'true',
 )
 
 # Configure CORS with credentials support
@@ -45,115 +53,79 @@ CORS(
 logging.basicConfig(level=logging.INFO)
 logging.getLogger('werkzeug').setLevel(logging.INFO)
 
-model = YOLO(MODEL_PATH)
-#cap = cv2.VideoCapture(1)
-cap = open_capture()
+# python app.py menjalankan reloader Werkzeug (debug=True): modul ini di-import oleh proses
+# watcher lalu sekali lagi oleh proses server (WERKZEUG_RUN_MAIN=true). Hanya proses server
+# yang memuat model dan menjalankan pipeline, supaya kamera dan event tidak berjalan dua kali
+RELOADER_WATCHER = __name__ == '__main__' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+
+USE_WORKER_PROCESSES = PIPELINE_MODE == "process" and PROCESS_MODE_AVAILABLE
+if PIPELINE_MODE == "process" and not PROCESS_MODE_AVAILABLE:
+    logging.warning("PIPELINE_MODE=process needs the fork start method, falling back to thread mode")
+
+# Model dimuat di background setelah server jalan (startup.py). Di mode process model
+# dimuat oleh proses inferensi (workers.py), bukan proses Flask.
+# PRELOAD_MODEL=true: dimuat saat import supaya dibagi ke worker hasil fork (gunicorn --preload);
+# warmup ditunda ke tiap worker karena thread pool runtime tidak aman dibawa melewati fork.
+model = load_model(do_warmup=False) if PRELOAD_MODEL and not USE_WORKER_PROCESSES and not RELOADER_WATCHER else None
 last_timestamp = None
 
 # ==========================
 # Deteksi hanya kelas "person" / "human"
 # ==========================
-try:
-    PERSON_CLASS_IDS = [i for i, n in model.names.items() if str(n).strip().lower() in ["person", "human"]]
-    logging.info(f"Model classes: {model.names}")
-    logging.info(f"Person class IDs: {PERSON_CLASS_IDS}")
-except Exception as e:
-    logging.warning(f"Error getting class IDs: {e}")
-    PERSON_CLASS_IDS = []
+PERSON_CLASS_IDS = person_class_ids(model) if model is not None else []
 
 # ==========================
 # Stream kamera + deteksi YOLO
 # ==========================
-# Tambahkan variabel global di awal
-
-def generate_frames():
-    global last_delay, last_db_insert, cap
-    frame_id = 0
-    prev_time = time.time()
-
-    while True:
-        # Ensure capture is opened; try to reconnect if not
-        try:
-            if cap is None or not cap.isOpened():
-                logging.warning("Camera is not opened. Attempting reconnect...")
-                new_cap = reconnect_camera(cap)
-                if new_cap is not None:
-                    cap = new_cap
-                else:
-                    time.sleep(0.5)
-                    continue
-        except Exception:
-            pass
-
-        frame = capture_frame(cap)
-        if frame is None:
-            logging.warning("Failed to read frame from camera")
-            new_cap = reconnect_camera(cap)
-            if new_cap is not None:
-                cap = new_cap
-            time.sleep(0.5)
-            continue
-
-        detected = False
-        human_count = 0
-        annotated = frame
-
-        if frame_id % SKIP_RATE == 0:
-            start_time = time.time()
-            results = model(
-                frame,
-                conf=0.2,
-                iou=0.45,
-                max_det=10,
-                classes=PERSON_CLASS_IDS if PERSON_CLASS_IDS else None
-            )
-
-            annotated = results[0].plot()
-            for r in results:
-                if len(r.boxes) > 0:
-                    for box in r.boxes:
-                        cls = int(box.cls[0])
-                        class_name = model.names[cls].strip().lower()
-                        if class_name in ["person", "human"] or not PERSON_CLASS_IDS:
-                            detected = True
-                    human_count += len([
-                        box for box in r.boxes if int(box.cls[0]) in PERSON_CLASS_IDS or not PERSON_CLASS_IDS
-                    ])
-
-            # Delay & jitter untuk deteksi saja
-            end_time = time.time()
-            delay = (end_time - start_time) * 1000
-            jitter = abs(delay - last_delay) if last_delay else 0
-            last_delay = delay
-
-            # Rate-limit ke database: jika deteksi, hanya insert jika sudah lewat 60 detik
-            current_time = time.time()
-            if detected and (current_time - last_db_insert) > 5:
-                try:
-                    _, _buf = cv2.imencode('.jpg', annotated)
-                    image_bytes = _buf.tobytes()
-                    insert_detection(DEVICE_ID, "HUMAN", jitter, delay, human_count, image_bytes)
-                    update_device(DEVICE_ID, "DETECTED")
-                    logging.info(f"Human detected at device {DEVICE_ID}, count={human_count}, delay={delay:.1f}ms, jitter={jitter:.1f}ms [DB INSERT]")
-                    last_db_insert = current_time
-                except Exception as e:
-                    logging.error(f"Database error: {e}")
-            elif detected:
-                logging.info(f"Human detected, skipping DB insert (interval < 1 menit)")
-
-        # Batasi FPS ke browser
-        t_now = time.time()
-        elapsed = t_now - prev_time
-        if elapsed < 1.0 / MAX_FPS:
-            time.sleep((1.0 / MAX_FPS) - elapsed)
-        prev_time = time.time()
-
-        # Encode + stream
-        _, buffer = cv2.imencode('.jpg', annotated)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        frame_id += 1
+# Satu producer di background untuk semua kamera (lihat pipeline.py): capture,
+# deteksi (batch), anotasi dan encode JPEG dilakukan sekali per frame, lalu
+# dibagikan ke semua viewer device tersebut lewat FrameHub.
+# Mode process: capture dan inferensi di proses worker, proses ini hanya meneruskan hasilnya.
+if USE_WORKER_PROCESSES:
+    pipeline = ProcessPipeline(load_camera_sources())
+    startup = Startup(pipeline)
+else:
+    pipeline = DetectionPipeline(model, PERSON_CLASS_IDS, load_camera_sources())
+    startup = Startup(pipeline, load_model, warmup)
+# Pastikan deteksi yang masih antre di writer tersimpan saat server berhenti
+atexit.register(pipeline.shutdown)
+
+# Kamera, producer (dan supervisor worker di mode process, sebelum Flask punya thread)
+# dimulai saat import. Di server pre-fork (STARTUP_DEFER=true) thread dimulai di tiap
+# worker: dari hook post_fork, atau paling lambat di request pertama
+if not STARTUP_DEFER and not RELOADER_WATCHER:
+    startup.ensure_started()
+
+@app.before_request
+def ensure_startup():
+    startup.ensure_started()
+
+# Metrik sisi viewer (FrameHub selalu ada di proses ini, di mode thread maupun process)
+REGISTRY.callback('yolo_viewers', 'Connected /video_feed viewers', 'gauge',
+                  lambda: {d: s.hub.viewer_count() for d, s in pipeline.streams.items()}, ('device',))
+REGISTRY.callback('yolo_dropped_frames_total', 'Frames dropped for slow viewers', 'counter',
+                  lambda: {d: s.hub.dropped for d, s in pipeline.streams.items()}, ('device',))
+REGISTRY.callback('yolo_event_clients', 'Connected /events clients', 'gauge', lambda: pipeline.events.viewer_count())
+REGISTRY.callback('yolo_db_pool_connections', 'Database pool connections by state', 'gauge',
+                  lambda: {state: (get_pool_stats() or {}).get(state, 0) for state in ('open', 'idle')}, ('state',))
+REGISTRY.callback('yolo_dropped_events_total', 'SSE events dropped for slow clients', 'counter',
+                  lambda: pipeline.events.dropped)
+REGISTRY.callback('yolo_dropped_boxes_total', 'Overlay box events dropped for slow /events/boxes clients', 'counter',
+                  lambda: pipeline.boxes.dropped)
+
+def generate_frames(stream):
+    pipeline.ensure_running()
+    q = stream.hub.subscribe()
+    try:
+        while True:
+            try:
+                _, frame_bytes = q.get(timeout=5)
+            except queue.Empty:
+                continue
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    finally:
+        stream.hub.unsubscribe(q)
 
 # ==========================
 # ROUTES
@@ -172,20 +144,35 @@ def login():
 
 @app.route('/realtime')
 def realtime():
-    return render_template('simple.html')
+    return render_template('simple.html', overlay_mode=OVERLAY_MODE)
 
 @app.route('/video_feed')
-def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/video_feed/<int:device_id>')
+def video_feed(device_id=None):
+    stream = pipeline.stream(device_id if device_id is not None else DEVICE_ID)
+    if stream is None:
+        # Mode multi-kamera tanpa DEVICE_ID di daftar: pakai kamera pertama
+        if device_id is not None:
+            return jsonify({"error": "Device not found"}), 404
+        stream = next(iter(pipeline.streams.values()))
+    return Response(generate_frames(stream), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def dashboard_payload(device_id):
+    data = get_dashboard_data_cached(device_id)
+    # Mode track: jumlah orang yang sedang terlihat, bukan jumlah di baris track terakhir
+    # (baris itu baru ditulis setelah orangnya keluar)
+    live_count = pipeline.present_counts().get(device_id)
+    return {
+        "human_count": live_count if live_count is not None else data.get("human_count", data.get("total_humans", 0)),
+        "total_detections": data.get("total_detections", 0),
+        "recent_detections": data.get("recent_detections", [])
+    }
+
 @app.route('/data')
 def data():
     try:
-        data = get_dashboard_data(DEVICE_ID)
-        payload = {
-            "human_count": data.get("human_count", data.get("total_humans", 0)),
-            "total_detections": data.get("total_detections", 0),
-            "recent_detections": data.get("recent_detections", [])
-        }
+        device_id = request.args.get('device_id', DEVICE_ID, type=int)
+        payload = dashboard_payload(device_id)
 
         return jsonify(payload)
 
@@ -197,51 +184,190 @@ def data():
             "recent_detections": []
         }), 500
 
+def parse_history_time(value):
+    """ISO 8601 ('2026-10-01', '2026-10-01T08:00', '2026-10-01 08:00:00') -> datetime lokal tanpa tz."""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+@app.route('/api/history')
+def history():
+    """Deret waktu deteksi per device (bucket minute/hour/day) dari tabel rollup,
+    dengan keyset pagination lewat parameter cursor (= next_cursor halaman sebelumnya)."""
+    device_id = request.args.get('device_id', DEVICE_ID, type=int)
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in HISTORY_BUCKETS:
+        return jsonify({"error": f"bucket must be one of {', '.join(HISTORY_BUCKETS)}"}), 400
+    try:
+        end = parse_history_time(request.args['end']) if request.args.get('end') else datetime.now()
+        start = parse_history_time(request.args['start']) if request.args.get('start') else end - HISTORY_DEFAULT_SPAN[bucket]
+        after = parse_history_time(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({"error": "start, end and cursor must be ISO 8601 timestamps"}), 400
+    if start >= end:
+        return jsonify({"error": "start must be before end"}), 400
+    limit = max(1, min(request.args.get('limit', 500, type=int), HISTORY_MAX_POINTS))
+    try:
+        points, next_cursor = get_detection_history(device_id, bucket, start, end, after=after, limit=limit)
+    except Exception as e:
+        logging.error(f"Error fetching detection history: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+    return jsonify({
+        "device_id": device_id,
+        "bucket": bucket,
+        "start": start.isoformat(sep=' ', timespec='seconds'),
+        "end": end.isoformat(sep=' ', timespec='seconds'),
+        "series": points,
+        "next_cursor": next_cursor,
+    })
+
+@app.route('/api/export')
+def export_detections():
+    """Export detections sebagai NDJSON/CSV yang di-stream (cursor unbuffered di database,
+    dikirim per chunk). Parquet hanya lewat CLI: python export_detections.py --format parquet."""
+    fmt = request.args.get('format', 'ndjson')
+    images = request.args.get('images', 'ref')
+    if fmt not in EXPORT_MIMETYPES:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_MIMETYPES)}"}), 400
+    if images not in IMAGE_MODES:
+        return jsonify({"error": f"images must be one of {', '.join(IMAGE_MODES)}"}), 400
+    try:
+        start = parse_history_time(request.args['start']) if request.args.get('start') else None
+        end = parse_history_time(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO 8601 timestamps"}), 400
+    device_id = request.args.get('device_id', type=int)
+    rows = export_rows(start, end, device_id, images)
+    chunks = iter_ndjson(rows) if fmt == 'ndjson' else iter_csv(rows, export_fields(images))
+    filename = f"detections_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{'csv' if fmt == 'csv' else 'ndjson'}"
+    response = Response(chunks, content_type=EXPORT_MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Gambar deteksi tidak pernah berubah: ETag = hash konten, boleh di-cache selamanya
+IMAGE_MAX_AGE = 365 * 24 * 3600
+image_cache = ImageCache()
+image_key_cache = ImageCache(max_bytes=1024 * 1024)  # detection_id -> image_key
+
+def lookup_image_key(detection_id):
+    key = image_key_cache.get(detection_id)
+    if key is None:
+        key = get_detection_image_key(detection_id)
+        if key:
+            image_key_cache.put(detection_id, key)
+    return key
+
+def immutable_image_response(response, etag):
+    response.set_etag(etag)
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = IMAGE_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
 @app.route('/detection_image/<int:detection_id>')
 def detection_image(detection_id):
+    thumb = request.args.get('size') == 'thumb'
+    filename = f"detection_{detection_id}{'_thumb' if thumb else ''}.jpg"
     try:
-        image_bytes = get_detection_image(detection_id)
-        if not image_bytes:
+        key = lookup_image_key(detection_id)
+        if key:
+            etag = f"{key}-thumb" if thumb else key
+            if request.if_none_match.contains(etag):
+                return immutable_image_response(make_response('', 304), etag)
+            if not thumb:
+                path = get_image_path(key)
+                if not path:
+                    return jsonify({"error": "Image not found"}), 404
+                # File dari image store: dikirim langsung (wsgi.file_wrapper / sendfile)
+                response = send_file(path, mimetype='image/jpeg', download_name=filename, etag=False)
+                return immutable_image_response(response, etag)
+            # Thumbnail kecil dan sering diminta tabel: simpan di LRU
+            data = image_cache.get(etag)
+            if data is None:
+                data = get_thumbnail(key)
+                if data:
+                    image_cache.put(etag, data)
+        else:
+            # Baris lama yang masih menyimpan LONGBLOB
+            cache_key = f"blob-{detection_id}-{'thumb' if thumb else 'full'}"
+            data = image_cache.get(cache_key)
+            if data is None:
+                data = get_detection_image(detection_id)
+                if data and thumb:
+                    data = make_thumbnail(bytes(data))
+                if data:
+                    data = bytes(data)
+                    image_cache.put(cache_key, data)
+            etag = image_key(data) if data else None
+
+        if not data:
             return jsonify({"error": "Image not found"}), 404
 
-        response = make_response(image_bytes)
+        response = make_response(data)
         response.headers['Content-Type'] = 'image/jpeg'
-        response.headers['Content-Disposition'] = f'inline; filename="detection_{detection_id}.jpg"'
-        return response
+        response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+        return immutable_image_response(response, etag)
     except Exception as e:
         logging.error(f"Error fetching detection image {detection_id}: {e}")
         return jsonify({"error": "Internal Server Error"}), 500
 
+@app.route('/detection_clip/<int:detection_id>')
+def detection_clip(detection_id):
+    """Klip pra/pasca-event milik baris deteksi. 404 juga selama klip masih direkam
+    dan untuk klip yang dibuang/gagal ditulis (clip_key-nya dikosongkan tak lama kemudian)."""
+    try:
+        key = get_detection_clip_key(detection_id)
+        path = get_clip_path(key)
+        if not path:
+            return jsonify({"error": "Clip not found"}), 404
+        fmt = key.rsplit(".", 1)[-1]
+        mimetype = CLIP_MIMETYPES.get(fmt, "application/octet-stream")
+        # conditional=True: ETag/304 dan Range request (seek di video player) ditangani send_file.
+        # Browser tidak bisa memutar MJPEG, jadi dikirim sebagai unduhan
+        response = send_file(path, mimetype=mimetype, download_name=os.path.basename(path),
+                             as_attachment=fmt == "mjpeg", conditional=True, etag=image_key(key.encode()))
+        response.cache_control.public = True
+        response.cache_control.max_age = IMAGE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+    except Exception as e:
+        logging.error(f"Error fetching detection clip {detection_id}: {e}")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+def check_health():
+    cameras = pipeline.camera_status()
+    camera_ok = any(cameras.values())
+
+    db_ok = check_database()
+
+    return {
+        'status': startup.readiness(cameras, db_ok),
+        'camera': 'connected' if camera_ok else 'disconnected',
+        'cameras': {str(k): 'connected' if v else 'disconnected' for k, v in cameras.items()},
+        'database': 'connected' if db_ok else 'disconnected',
+        'model': startup.model_status(),
+    }
+
 @app.route('/health')
 def health():
     """Endpoint untuk cek status sistem"""
     try:
-        camera_ok = cap.isOpened()
-
-        from database import get_connection
-        db_ok = False
-        try:
-            conn = get_connection()
-            if conn.is_connected():
-                db_ok = True
-                conn.close()
-        except Exception as db_error:
-            logging.error(f"Database connection error: {db_error}")
-            db_ok = False
-
-        model_ok = False
-        try:
-            if model is not None:
-                model_ok = True
-        except Exception:
-            model_ok = False
-
-        return jsonify({
-            'status': 'OK',
-            'camera': 'connected' if camera_ok else 'disconnected',
-            'database': 'connected' if db_ok else 'disconnected',
-            'model': 'loaded' if model_ok else 'not_loaded'
+        payload = check_health()
+        payload.update({
+            'db_pool': get_pool_stats(),
+            'db_writer': pipeline.writer_stats(),
+            'image_cache': image_cache.stats(),
+            'cache': get_cache_stats(),
+            'motion': {str(k): v for k, v in pipeline.motion_stats().items()},
+            'tracking': {str(k): v for k, v in pipeline.tracker_stats().items()},
+            'clips': pipeline.clip_stats(),
+            'encoder': pipeline.encoder_stats(),
+            'startup': startup.state()
         })
+        return jsonify(payload)
     except Exception as e:
         logging.error(f"Health check error: {e}")
         return jsonify({
@@ -249,6 +375,115 @@ def health():
             'error': str(e)
         }), 500
 
+@app.route('/metrics')
+def metrics():
+    """Metrik format Prometheus (timing per tahap, counter, gauge antrean/viewer)"""
+    return Response(REGISTRY.render(extra=pipeline.worker_metrics()),
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/adaptive')
+def adaptive():
+    """Setting dan keputusan controller adaptif per kamera"""
+    return jsonify({str(k): v for k, v in pipeline.adaptive_state().items()})
+
+# ==========================
+# Server-Sent Events: push deteksi dan perubahan health ke dashboard
+# ==========================
+HEALTH_WATCH_INTERVAL = float(os.getenv("HEALTH_WATCH_INTERVAL", "5"))  # detik
+SSE_KEEPALIVE = 15  # detik
+last_health = None
+health_thread = None
+health_lock = threading.Lock()
+
+def health_watch():
+    """Satu thread untuk semua dashboard: cek health berkala, publish hanya saat berubah."""
+    global last_health
+    while True:
+        if pipeline.events.viewer_count() > 0:
+            try:
+                current = check_health()
+                if current != last_health:
+                    last_health = current
+                    pipeline.events.publish(("health", current))
+            except Exception as e:
+                logging.error(f"Health watch error: {e}")
+        time.sleep(HEALTH_WATCH_INTERVAL)
+
+def ensure_health_watch():
+    global health_thread
+    with health_lock:
+        if health_thread is None or not health_thread.is_alive():
+            health_thread = threading.Thread(target=health_watch, name="health-watch", daemon=True)
+            health_thread.start()
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return http_date(value)  # format sama dengan jsonify di /data
+    return str(value)
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+def sse_response(stream):
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/events')
+def events():
+    device_id = request.args.get('device_id', DEVICE_ID, type=int)
+    ensure_health_watch()
+    pipeline.ensure_running()
+
+    def stream():
+        global last_health
+        q = pipeline.events.subscribe()
+        try:
+            if last_health is None:
+                last_health = check_health()
+            yield sse_message('health', last_health)
+            try:
+                yield sse_message('snapshot', dashboard_payload(device_id))
+            except Exception as e:
+                logging.error(f"Error fetching snapshot: {e}")
+            while True:
+                try:
+                    kind, data = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if kind in ('detection', 'tracks') and data['device_id'] != device_id:
+                    continue
+                yield sse_message(kind, data)
+        finally:
+            pipeline.events.unsubscribe(q)
+
+    return sse_response(stream())
+
+@app.route('/events/boxes')
+def box_events():
+    """Box deteksi untuk OVERLAY_MODE=client, terpisah dari /events: client lambat
+    hanya kehilangan box lama (drop-oldest), bukan event deteksi."""
+    device_id = request.args.get('device_id', DEVICE_ID, type=int)
+    pipeline.ensure_running()
+
+    def stream():
+        q = pipeline.boxes.subscribe()
+        try:
+            while True:
+                try:
+                    data = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if data['device_id'] == device_id:
+                    yield sse_message('boxes', data)
+        finally:
+            pipeline.boxes.unsubscribe(q)
+
+    return sse_response(stream())
+
 @app.route('/api/login', methods=['POST', 'OPTIONS'])
 def api_login():
     print("\n=== Login Attempt ===")
@@ -0,0 +1,302 @@
+"""
+Benchmark offline pipeline deteksi tanpa ESP32-CAM dan MySQL: video atau folder
+gambar diputar ulang lewat DetectionPipeline yang sama dengan aplikasi (grabber
+dari file, producer, inferensi, tracking, anotasi, encode, DetectionWriter),
+dengan database SQLite (default in-memory).
+
+    python benchmark.py --source rekaman.mp4 --output bench.json
+    python benchmark.py --source captures/ --frames 500 --compare bench_lama.json
+
+Waktu per tahap diambil dari histogram metrik pipeline (metrics.py), jadi yang
+diukur adalah kode aplikasi, bukan salinannya. Hasil berupa JSON (latensi per
+tahap p50/p95/p99, FPS, CPU, RSS) supaya bisa dibandingkan antar commit.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import threading
+import subprocess
+import tempfile
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Tahap -> histogram di metrics.py (detik); total = umur frame dari capture sampai publish
+STAGES = {
+    "capture": "CAPTURE_WAIT",
+    "inference": "INFERENCE_TIME",
+    "annotate": "PLOT_TIME",
+    "encode": "ENCODE_TIME",
+    "persist": "DB_WRITE_TIME",
+    "total": "FRAME_AGE",
+}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+BENCH_DEVICE_ID = 1  # device bawaan schema SQLite
+DRAIN_TIMEOUT = 30  # detik, menunggu producer memproses frame terakhir
+
+
+def iter_source(path, loops=1):
+    """Frame sebagai FramePacket: video dibaca dengan OpenCV, gambar JPEG diteruskan
+    sebagai bytes (seperti MJPEG_PASSTHROUGH) dan di-decode di tahap capture."""
+    import cv2
+    from frame_encoder import FramePacket
+    for _ in range(loops):
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                full = os.path.join(path, name)
+                if name.lower().endswith((".jpg", ".jpeg")):
+                    with open(full, "rb") as f:
+                        packet = FramePacket(jpeg=f.read())
+                else:
+                    packet = FramePacket(image=cv2.imread(full))
+                if packet.image is not None:
+                    yield packet
+        else:
+            cap = cv2.VideoCapture(path)
+            if not cap.isOpened():
+                raise SystemExit(f"Cannot open video: {path}")
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                yield FramePacket(image=frame)
+            cap.release()
+
+
+class ReplayGrabber:
+    """Antarmuka FrameGrabber di atas iter_source untuk DetectionPipeline. Setiap
+    latest_packet() memberi frame berikutnya dan membangunkan producer lagi, jadi
+    setiap frame diproses (tidak ada latest-frame-wins) secepat producer mampu."""
+
+    reconnects = 0
+
+    def __init__(self, frames, frame_event, limit=0):
+        self._frames = frames
+        self.frame_event = frame_event
+        self.limit = limit
+        self.served = 0
+        self.done = threading.Event()
+        self._last = (None, None, 0)
+
+    def start(self):
+        self.frame_event.set()
+        return self
+
+    def stop(self):
+        self.done.set()
+
+    def is_opened(self):
+        return not self.done.is_set()
+
+    def latest_packet(self):
+        if self.done.is_set():
+            return self._last
+        packet = next(self._frames, None) if self.limit <= 0 or self.served < self.limit else None
+        if packet is None:
+            self.done.set()
+            return self._last
+        self.served += 1
+        self._last = (packet, time.time(), self.served)
+        self.frame_event.set()
+        return self._last
+
+
+def record_stages():
+    """Salin setiap observasi histogram tahap (detik) ke list milidetik, tanpa
+    mengubah histogram-nya. Return {tahap: [ms]}."""
+    import metrics
+    timings = {stage: [] for stage in STAGES}
+    for stage, name in STAGES.items():
+        histogram = getattr(metrics, name)
+        values = timings[stage]
+
+        def observe(value, _observe=histogram.observe, _values=values, **labels):
+            _values.append(value * 1000)
+            _observe(value, **labels)
+        histogram.observe = observe
+    return timings
+
+
+def percentiles(values):
+    import numpy as np
+    if not values:
+        return None
+    arr = np.asarray(values)
+    return {
+        "count": len(values),
+        "mean": round(float(arr.mean()), 3),
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "max": round(float(arr.max()), 3),
+    }
+
+
+def _cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _rss_mb():
+    """RSS saat ini dan puncak (MB)."""
+    current = peak = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux: KB, macOS: bytes
+        peak = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return (round(current, 1) if current else None), (round(peak, 1) if peak else None)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    # Import setelah env diset: pipeline.py, database.py dan image_store.py membaca konfigurasi saat import
+    from inference import load_model, person_class_ids, INFERENCE_BACKEND, INFERENCE_PRECISION
+    from pipeline import DetectionPipeline, SKIP_RATE, DETECTION_EVENTS, OVERLAY_MODE
+    from motion_gate import MOTION_GATE
+    from adaptive_control import ADAPTIVE_CONTROL
+    from frame_encoder import encoder_stats
+
+    model = load_model(imgsz=args.imgsz)
+    timings = record_stages()
+    frame_event = threading.Event()
+    grabber = ReplayGrabber(iter_source(args.source, args.loops), frame_event, args.frames)
+    pipeline = DetectionPipeline(model, person_class_ids(model), {BENCH_DEVICE_ID: args.source},
+                                 grabbers={BENCH_DEVICE_ID: grabber}, frame_event=frame_event)
+    stream = pipeline.stream(BENCH_DEVICE_ID)
+
+    cpu_start = _cpu_seconds()
+    wall_start = time.perf_counter()
+    try:
+        pipeline.ensure_running()
+        grabber.done.wait()
+        # Frame terakhir mungkin masih diproses producer
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while stream.frame_id < grabber.served and time.monotonic() < deadline:
+            time.sleep(0.01)
+        wall = time.perf_counter() - wall_start
+    finally:
+        # Seperti saat server berhenti: track yang masih aktif dicatat, writer di-flush
+        pipeline.shutdown()
+    cpu = _cpu_seconds() - cpu_start
+    rss, peak_rss = _rss_mb()
+    frames = stream.frame_id
+    inferred = len(timings["inference"])
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "config": {
+            "source": args.source,
+            "backend": INFERENCE_BACKEND,
+            "precision": INFERENCE_PRECISION,
+            "imgsz": args.imgsz,
+            "skip_rate": SKIP_RATE,
+            "jpeg_quality": args.quality,
+            "motion_gate": MOTION_GATE,
+            "adaptive_control": ADAPTIVE_CONTROL,
+            "overlay": OVERLAY_MODE,
+            "detection_events": DETECTION_EVENTS,
+            "jpeg_encoder": encoder_stats()["backend"],
+            "db": os.environ.get("DB_SQLITE_PATH"),
+        },
+        "frames": frames,
+        "inferred": inferred,
+        "tracking": pipeline.tracker_stats().get(BENCH_DEVICE_ID),
+        "events_written": pipeline.writer_stats().get("written"),
+        "wall_seconds": round(wall, 3),
+        "fps": round(frames / wall, 2) if wall > 0 else 0.0,
+        "inference_fps": round(inferred / wall, 2) if wall > 0 else 0.0,
+        "cpu_seconds": round(cpu, 3),
+        "cpu_percent": round(cpu / wall * 100, 1) if wall > 0 else 0.0,
+        "rss_mb": rss,
+        "peak_rss_mb": peak_rss,
+        "stages_ms": {stage: percentiles(values) for stage, values in timings.items() if values},
+    }
+
+
+def compare(current, baseline):
+    """Selisih p50/p95 per tahap dan FPS terhadap hasil sebelumnya."""
+    print(f"\nvs {baseline.get('commit') or 'baseline'}:")
+    print(f"  {'fps':<12} {baseline['fps']:>9} -> {current['fps']:>9}")
+    for stage, stats in current["stages_ms"].items():
+        old = baseline.get("stages_ms", {}).get(stage)
+        if not old:
+            continue
+        for key in ("p50", "p95"):
+            change = (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            print(f"  {stage + ' ' + key:<12} {old[key]:>9.2f} -> {stats[key]:>9.2f} ms ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline replay benchmark for the detection pipeline")
+    parser.add_argument("--source", required=True, help="Video file or directory of images")
+    parser.add_argument("--frames", type=int, default=0, help="Stop after N frames (0 = whole source)")
+    parser.add_argument("--loops", type=int, default=1, help="Replay the source N times")
+    parser.add_argument("--imgsz", type=int, default=int(os.getenv("INFERENCE_IMGSZ", "640")))
+    parser.add_argument("--skip-rate", type=int, default=1, help="Run the model on every Nth frame")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality of the output frames")
+    parser.add_argument("--persist", choices=("track", "interval"), default="track",
+                        help="DETECTION_EVENTS of the pipeline: one row per finished track, or per DB_INSERT_INTERVAL")
+    parser.add_argument("--db", default=":memory:", help="SQLite database path")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="Previous JSON result to compare against")
+    args = parser.parse_args()
+
+    # Konfigurasi pipeline lewat env yang sama dengan aplikasi; tanpa batas MAX_FPS supaya
+    # yang diukur kecepatan producer, dan tanpa klip supaya CLIP_DIR aplikasi tidak tersentuh
+    os.environ.update({
+        "SKIP_RATE": str(args.skip_rate),
+        "INFERENCE_IMGSZ": str(args.imgsz),
+        "STREAM_JPEG_QUALITY": str(args.quality),
+        "DETECTION_EVENTS": args.persist,
+        "MAX_FPS": "1000000",
+        "CLIP_RECORDING": "false",
+    })
+    # Database dan image store sementara, tidak menyentuh MySQL atau folder snapshot aplikasi
+    os.environ["DB_DRIVER"] = "sqlite"
+    os.environ["DB_SQLITE_PATH"] = args.db
+    image_dir = None
+    if "IMAGE_STORE_DIR" not in os.environ:
+        image_dir = os.environ["IMAGE_STORE_DIR"] = tempfile.mkdtemp(prefix="bench_images_")
+
+    try:
+        result = run(args)
+    finally:
+        if image_dir is not None:
+            shutil.rmtree(image_dir, ignore_errors=True)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Benchmark results written to {args.output}")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
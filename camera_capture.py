@@ -1,23 +1,43 @@
 """
 Script untuk mengambil gambar dari ESP32-CAM atau webcam setiap interval
+
+CAPTURE_MODE=legacy     satu kamera, PNG, tunggu CAPTURE_INTERVAL setelah setiap simpan
+CAPTURE_MODE=scheduled  beberapa kamera (CAPTURE_SOURCES), jadwal tetap tanpa drift,
+                        encode JPEG/WebP di worker pool, folder per hari/jam dan
+                        retensi berdasarkan ukuran (CAPTURE_MAX_BYTES)
 """
 
 import cv2
 import os
+import re
 from datetime import datetime
 import time
 import logging
-import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from frame_encoder import FramePacket, decode_jpeg
 
 load_dotenv()
 
 # Konfigurasi
 ESP32_STREAM_URL = os.getenv("ESP32_STREAM_URL")
-CAPTURE_INTERVAL = int(os.getenv("CAPTURE_INTERVAL", "30"))  # detik
+CAPTURE_INTERVAL = float(os.getenv("CAPTURE_INTERVAL", "30"))  # detik
 OUTPUT_DIR = os.getenv("CAPTURE_OUTPUT_DIR", "captures")
+CAPTURE_MODE = os.getenv("CAPTURE_MODE", "legacy").lower()  # legacy | scheduled
+CAPTURE_SOURCES = os.getenv("CAPTURE_SOURCES", "")  # contoh: depan=http://10.0.0.11:81/stream,lab=0
+CAPTURE_FORMAT = os.getenv("CAPTURE_FORMAT", "jpeg").lower()  # jpeg | webp
+CAPTURE_QUALITY = int(os.getenv("CAPTURE_QUALITY", "90"))
+CAPTURE_WORKERS = int(os.getenv("CAPTURE_WORKERS", "2"))
+CAPTURE_ROTATE = os.getenv("CAPTURE_ROTATE", "hour").lower()  # hour | day
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", "0"))  # 0 = tanpa batas
 USE_WEBCAM = os.getenv("USE_WEBCAM", "false").lower() == "true"
 WEBCAM_INDEX = int(os.getenv("WEBCAM_INDEX", "0"))
+RECONNECT_BACKOFF_INITIAL = float(os.getenv("RECONNECT_BACKOFF_INITIAL", "0.5"))  # detik
+RECONNECT_BACKOFF_MAX = float(os.getenv("RECONNECT_BACKOFF_MAX", "30"))  # detik
+# Baca stream MJPEG HTTP (ESP32) langsung sebagai JPEG, tanpa decode/re-encode jika tidak perlu
+MJPEG_PASSTHROUGH = os.getenv("MJPEG_PASSTHROUGH", "false").lower() == "true"
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -28,24 +48,94 @@ def create_output_directory():
         os.makedirs(OUTPUT_DIR)
         logger.info(f"Folder '{OUTPUT_DIR}' created")
 
-def open_capture():
-    if USE_WEBCAM:
-        logger.info(f"Opening webcam index {WEBCAM_INDEX}...")
+class MjpegReader:
+    """Pembaca stream MJPEG over HTTP (multipart/x-mixed-replace) yang mengembalikan
+    bytes JPEG asli per frame. Antarmukanya mengikuti cv2.VideoCapture."""
+
+    MAX_BUFFER = 4 * 1024 * 1024
+
+    def __init__(self, url, timeout=10):
+        self._buf = b""
+        try:
+            self._resp = urllib.request.urlopen(url, timeout=timeout)
+            self._opened = True
+        except Exception as e:
+            logger.error(f"Cannot open MJPEG stream {url}: {e}")
+            self._resp = None
+            self._opened = False
+
+    def isOpened(self):
+        return self._opened
+
+    def set(self, prop, value):
+        return False
+
+    def read_jpeg(self):
+        while self._opened:
+            start = self._buf.find(b"\xff\xd8")
+            if start >= 0:
+                end = self._buf.find(b"\xff\xd9", start + 2)
+                if end >= 0:
+                    jpeg = self._buf[start:end + 2]
+                    self._buf = self._buf[end + 2:]
+                    return jpeg
+            try:
+                chunk = self._resp.read1(65536)
+            except Exception as e:
+                logger.error(f"Error reading MJPEG stream: {e}")
+                chunk = b""
+            if not chunk:
+                self._opened = False
+                return None
+            self._buf += chunk
+            if len(self._buf) > self.MAX_BUFFER:
+                # Tidak ketemu batas frame: buang data lama
+                self._buf = self._buf[-65536:]
+        return None
+
+    def read(self):
+        jpeg = self.read_jpeg()
+        if jpeg is None:
+            return False, None
+        frame = decode_jpeg(jpeg)
+        return frame is not None, frame
+
+    def release(self):
+        self._opened = False
+        try:
+            if self._resp is not None:
+                self._resp.close()
+        except Exception:
+            pass
+
+def open_capture(source=None):
+    """Buka capture untuk source tertentu (URL stream atau index webcam).
+    Tanpa source, dipakai konfigurasi USE_WEBCAM / ESP32_STREAM_URL."""
+    if source is None:
+        source = WEBCAM_INDEX if USE_WEBCAM else ESP32_STREAM_URL
+    if isinstance(source, str) and source.strip().isdigit():
+        source = int(source)
+    if MJPEG_PASSTHROUGH and isinstance(source, str) and source.startswith(("http://", "https://")):
+        logger.info(f"Connecting to MJPEG stream at {source} (passthrough)...")
+        return MjpegReader(source)
+
+    if isinstance(source, int):
+        logger.info(f"Opening webcam index {source}...")
         # On Windows, CAP_DSHOW is often more reliable
         try:
             if os.name == 'nt':
-                cap = cv2.VideoCapture(WEBCAM_INDEX, cv2.CAP_DSHOW)
+                cap = cv2.VideoCapture(source, cv2.CAP_DSHOW)
             else:
-                cap = cv2.VideoCapture(WEBCAM_INDEX)
+                cap = cv2.VideoCapture(source)
         except Exception:
-            cap = cv2.VideoCapture(WEBCAM_INDEX)
+            cap = cv2.VideoCapture(source)
     else:
-        logger.info(f"Connecting to camera at {ESP32_STREAM_URL}...")
+        logger.info(f"Connecting to camera at {source}...")
         # Prefer FFMPEG backend for network streams when available
         try:
-            cap = cv2.VideoCapture(ESP32_STREAM_URL, cv2.CAP_FFMPEG)
+            cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
         except Exception:
-            cap = cv2.VideoCapture(ESP32_STREAM_URL)
+            cap = cv2.VideoCapture(source)
     cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
     return cap
 
@@ -78,12 +168,334 @@ def reconnect_camera(old_cap):
         logger.error("Failed to reconnect to camera!")
         return None
 
+class FrameGrabber:
+    """Membaca stream terus-menerus di thread sendiri dan hanya menyimpan frame
+    terbaru (latest-frame-wins). Reconnect dilakukan di background dengan
+    exponential backoff, sehingga pemanggil tidak pernah ikut tertahan."""
+
+    def __init__(self, source=None, backoff_initial=RECONNECT_BACKOFF_INITIAL,
+                 backoff_max=RECONNECT_BACKOFF_MAX, frame_event=None):
+        self.source = source
+        self.frame_event = frame_event  # opsional, di-set setiap ada frame baru (multi-kamera)
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.reconnects = 0
+        self._cap = None
+        self._packet = None
+        self._timestamp = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"frame-grabber-{self.source}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self._release()
+
+    def is_opened(self):
+        cap = self._cap
+        try:
+            return cap is not None and cap.isOpened()
+        except Exception:
+            return False
+
+    def read(self, last_seq=0, timeout=1.0):
+        """Tunggu frame yang lebih baru dari last_seq.
+        Return (frame, timestamp, seq) atau (None, None, last_seq) jika timeout."""
+        with self._cond:
+            if self._seq <= last_seq:
+                self._cond.wait_for(lambda: self._seq > last_seq or self._stop.is_set(), timeout=timeout)
+            if self._seq <= last_seq:
+                return None, None, last_seq
+            packet, timestamp, seq = self._packet, self._timestamp, self._seq
+        return packet.image, timestamp, seq
+
+    def latest(self):
+        packet, timestamp, seq = self.latest_packet()
+        return (packet.image if packet is not None else None), timestamp, seq
+
+    def latest_packet(self):
+        """Seperti latest(), tetapi mengembalikan FramePacket (JPEG asli kamera
+        jika ada, decode hanya saat .image diakses)."""
+        with self._cond:
+            return self._packet, self._timestamp, self._seq
+
+    def _release(self):
+        try:
+            if self._cap is not None:
+                self._cap.release()
+        except Exception:
+            pass
+        self._cap = None
+
+    def _run(self):
+        backoff = self.backoff_initial
+        while not self._stop.is_set():
+            if not self.is_opened():
+                self._release()
+                cap = open_capture(self.source)
+                if not cap.isOpened():
+                    try:
+                        cap.release()
+                    except Exception:
+                        pass
+                    logger.warning(f"Camera open failed, retrying in {backoff:.1f}s")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.backoff_max)
+                    continue
+                self._cap = cap
+                logger.info("Camera connected (grabber)")
+            try:
+                if hasattr(self._cap, "read_jpeg"):
+                    jpeg = self._cap.read_jpeg()
+                    packet = FramePacket(jpeg=jpeg) if jpeg is not None else None
+                else:
+                    success, frame = self._cap.read()
+                    packet = FramePacket(image=frame) if success and frame is not None else None
+            except Exception as e:
+                logger.error(f"Error capturing frame: {e}")
+                packet = None
+            if packet is None:
+                logger.warning(f"Failed to read frame from camera, reconnecting in {backoff:.1f}s")
+                self.reconnects += 1
+                self._release()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+                continue
+            backoff = self.backoff_initial
+            with self._cond:
+                self._packet = packet
+                self._timestamp = time.time()
+                self._seq += 1
+                self._cond.notify_all()
+            if self.frame_event is not None:
+                self.frame_event.set()
+
 def save_frame(frame, filename):
     filepath = os.path.join(OUTPUT_DIR, filename)
     cv2.imwrite(filepath, frame)
     logger.info(f"Frame saved: {filepath}")
 
+CAPTURE_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+# Path relatif yang dibuat CaptureStore.path_for (rotasi hari atau jam). File lain di
+# CAPTURE_OUTPUT_DIR (PNG mode lama, file milik pengguna) tidak dihitung dan tidak dihapus
+_CAPTURE_PATH = re.compile(r"^\d{8}(/\d{2})?/\d{6}_\d{3}_[^/]+(%s)$"
+                           % "|".join(re.escape(ext) for ext in CAPTURE_EXTENSIONS.values()))
+
+
+def parse_capture_sources(value):
+    """Parse "nama=source,nama=source" menjadi {nama: source}. Tanpa CAPTURE_SOURCES
+    dipakai satu kamera dari konfigurasi USE_WEBCAM / ESP32_STREAM_URL."""
+    sources = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, source = item.partition("=")
+        sources[name.strip()] = source.strip() or None
+    return sources or {"cam": None}
+
+
+def encode_capture(packet, fmt=CAPTURE_FORMAT, quality=CAPTURE_QUALITY):
+    """Bytes file untuk satu frame. JPEG kamera (MJPEG_PASSTHROUGH) disimpan apa adanya."""
+    if fmt == "webp":
+        ok, buf = cv2.imencode(".webp", packet.image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        if not ok:
+            raise ValueError("WebP encode failed")
+        return buf.tobytes()
+    return packet.jpeg(quality)
+
+
+class CaptureStore:
+    """Folder output berotasi per hari (YYYYMMDD) atau jam (YYYYMMDD/HH). Nama file diawali
+    jam capture, jadi urutan path = urutan waktu; file tertua dihapus lebih dulu
+    jika total ukuran melewati max_bytes."""
+
+    def __init__(self, root=OUTPUT_DIR, rotate=CAPTURE_ROTATE, max_bytes=CAPTURE_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.rotate = rotate
+        self.max_bytes = max_bytes
+        self.files = []  # [(path, size)] urut waktu
+        self.total_bytes = 0
+        self.deleted = 0
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _scan(self):
+        # Capture dari run sebelumnya ikut dihitung dalam batas ukuran
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if _CAPTURE_PATH.match(os.path.relpath(path, self.root).replace(os.sep, "/")):
+                    self.files.append((path, os.path.getsize(path)))
+        self.files.sort()
+        self.total_bytes = sum(size for _, size in self.files)
+
+    def path_for(self, camera, timestamp, ext):
+        t = datetime.fromtimestamp(timestamp)
+        parts = [self.root, t.strftime("%Y%m%d")]
+        if self.rotate == "hour":
+            parts.append(t.strftime("%H"))
+        return os.path.join(*parts, f"{t.strftime('%H%M%S')}_{t.microsecond // 1000:03d}_{camera}{ext}")
+
+    def save(self, camera, timestamp, data, ext):
+        path = self.path_for(camera, timestamp, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            self.files.append((path, len(data)))
+            if len(self.files) > 1 and self.files[-2][0] > path:
+                # Worker bisa selesai tidak berurutan
+                self.files.sort()
+            self.total_bytes += len(data)
+            self._enforce_retention()
+        return path
+
+    def _enforce_retention(self):
+        while self.max_bytes > 0 and self.total_bytes > self.max_bytes and len(self.files) > 1:
+            path, size = self.files.pop(0)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+                self.deleted += 1
+            except OSError as e:
+                logger.warning(f"Retention failed to remove {path}: {e}")
+            # Folder jam/hari yang sudah kosong ikut dihapus
+            directory = os.path.dirname(path)
+            while directory != self.root and directory.startswith(self.root):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+
+
+def check_capture_interval(interval):
+    """CAPTURE_INTERVAL harus > 0: 0 membuat scheduler membagi dengan nol atau berputar tanpa jeda."""
+    if not interval > 0:
+        raise ValueError(f"CAPTURE_INTERVAL must be a positive number of seconds, got {interval}")
+    return interval
+
+
+class IntervalCapture:
+    """Scheduler laju tetap: tick ke-n dijadwalkan di start + n * interval (tidak bergeser
+    oleh lama encode/tulis). Setiap tick mengambil frame terbaru tiap FrameGrabber dan
+    menyerahkan encode + tulis ke worker pool. Tick yang terlewat tidak dikejar, dan
+    frame dibuang jika worker masih tertinggal, supaya jadwal tetap terjaga."""
+
+    def __init__(self, sources, store, interval=CAPTURE_INTERVAL, fmt=CAPTURE_FORMAT,
+                 quality=CAPTURE_QUALITY, workers=CAPTURE_WORKERS):
+        self.interval = check_capture_interval(interval)
+        self.grabbers = {name: FrameGrabber(source) for name, source in sources.items()}
+        self.store = store
+        self.fmt = fmt if fmt in CAPTURE_EXTENSIONS else "jpeg"
+        self.quality = quality
+        self.workers = max(1, workers)
+        self.max_pending = self.workers * 2
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="capture-encode")
+        self._last_seq = {name: 0 for name in self.grabbers}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.stats = {"saved": 0, "stale": 0, "dropped": 0, "missed_ticks": 0, "failed": 0}
+
+    def run(self):
+        for grabber in self.grabbers.values():
+            grabber.start()
+        next_tick = time.monotonic()
+        ticks = 0
+        log_every = max(1, int(60 / self.interval))
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now < next_tick:
+                self._stop.wait(next_tick - now)
+                continue
+            missed = int((now - next_tick) // self.interval)
+            if missed:
+                self.stats["missed_ticks"] += missed
+            next_tick += (missed + 1) * self.interval
+            for name, grabber in self.grabbers.items():
+                self._capture(name, grabber)
+            ticks += 1
+            if ticks % log_every == 0:
+                logger.info(f"Capture stats: {self.stats}, stored={self.store.total_bytes / 1e6:.1f}MB "
+                            f"in {len(self.store.files)} files, retention deleted={self.store.deleted}")
+
+    def stop(self):
+        self._stop.set()
+        for grabber in self.grabbers.values():
+            grabber.stop()
+        self._executor.shutdown(wait=True)
+
+    def _capture(self, name, grabber):
+        packet, timestamp, seq = grabber.latest_packet()
+        if packet is None or seq == self._last_seq[name]:
+            # Kamera belum mengirim frame baru sejak tick sebelumnya: jangan simpan duplikat
+            self.stats["stale"] += 1
+            return
+        self._last_seq[name] = seq
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats["dropped"] += 1
+                logger.warning(f"Encoder workers behind, dropping capture from {name}")
+                return
+            self._pending += 1
+        self._executor.submit(self._save, name, packet, timestamp)
+
+    def _save(self, name, packet, timestamp):
+        try:
+            data = encode_capture(packet, self.fmt, self.quality)
+            path = self.store.save(name, timestamp, data, CAPTURE_EXTENSIONS[self.fmt])
+            logger.debug(f"Frame saved: {path}")
+            with self._lock:
+                self.stats["saved"] += 1
+        except Exception as e:
+            logger.error(f"Failed to save capture from {name}: {e}")
+            with self._lock:
+                self.stats["failed"] += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+def scheduled_main():
+    sources = parse_capture_sources(CAPTURE_SOURCES)
+    store = CaptureStore()
+    capture = IntervalCapture(sources, store)
+    logger.info(f"Scheduled capture every {CAPTURE_INTERVAL}s from {list(sources)} as {capture.fmt} "
+                f"(quality {CAPTURE_QUALITY}, {capture.workers} workers)")
+    logger.info(f"Saving images to: {store.root} (rotate per {CAPTURE_ROTATE}, "
+                f"limit {CAPTURE_MAX_BYTES / 1e9:.1f}GB)" if CAPTURE_MAX_BYTES else
+                f"Saving images to: {store.root} (rotate per {CAPTURE_ROTATE}, no size limit)")
+    logger.info("Press Ctrl+C to stop")
+    try:
+        capture.run()
+    except KeyboardInterrupt:
+        logger.info("\nStopping capture...")
+    finally:
+        capture.stop()
+        logger.info(f"Capture stats: {capture.stats}")
+
+
 def main():
+    try:
+        check_capture_interval(CAPTURE_INTERVAL)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if CAPTURE_MODE == "scheduled":
+        return scheduled_main()
     create_output_directory()
     cap = open_capture()
 
@@ -0,0 +1,294 @@
+"""
+Klip pra/pasca-event: setiap kamera menyimpan beberapa detik frame JPEG terakhir
+(bytes yang sama dengan yang dikirim ke viewer, tanpa encode ulang) di ring
+buffer memori. Saat ada deteksi, isi buffer menjadi awal klip, frame berikutnya
+ditambahkan sampai CLIP_POST_SECONDS setelah deteksi terakhir, lalu klip
+diserahkan ke thread writer. Loop video tidak pernah menyentuh disk.
+
+Format:
+    mjpeg  JPEG berurutan dalam satu file .mjpeg (tanpa decode). Browser tidak bisa
+           memutarnya: /detection_clip mengirimnya sebagai unduhan (ffplay/VLC)
+    webm   VP8, di-decode dan ditulis cv2.VideoWriter di thread writer; diputar browser
+    mp4    H.264 (avc1) jika build OpenCV punya encodernya, selain itu MPEG-4 Part 2
+           (mp4v) yang hanya bisa diunduh, karena browser tidak memutar mp4v
+
+Key klip disimpan di baris deteksi sebelum file ada. Klip yang dibuang (antrean
+writer penuh) atau gagal ditulis dilaporkan ke on_discard dari thread writer,
+dan pipeline tidak lagi memakai key-nya untuk event berikutnya.
+
+Memori dibatasi CLIP_BUFFER_MAX_BYTES per kamera (buffer pra-event) dan per klip
+yang sedang direkam, ditambah paling banyak CLIP_QUEUE_SIZE klip yang menunggu ditulis.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from dotenv import load_dotenv
+from image_store import _write_atomic
+
+load_dotenv()
+
+# Konfigurasi
+CLIP_RECORDING = os.getenv("CLIP_RECORDING", "false").lower() == "true"
+CLIP_PRE_SECONDS = float(os.getenv("CLIP_PRE_SECONDS", "3"))
+CLIP_POST_SECONDS = float(os.getenv("CLIP_POST_SECONDS", "3"))
+CLIP_MAX_SECONDS = float(os.getenv("CLIP_MAX_SECONDS", "30"))  # klip dipotong jika orang terlihat terus
+CLIP_BUFFER_MAX_BYTES = int(os.getenv("CLIP_BUFFER_MAX_BYTES", str(16 * 1024 * 1024)))
+CLIP_QUEUE_SIZE = int(os.getenv("CLIP_QUEUE_SIZE", "8"))
+CLIP_FORMAT = os.getenv("CLIP_FORMAT", "mjpeg").lower()  # mjpeg | webm | mp4
+CLIP_DIR = os.path.abspath(os.getenv("CLIP_DIR", "detection_clips"))
+
+CLIP_MIMETYPES = {"mjpeg": "video/x-motion-jpeg", "webm": "video/webm", "mp4": "video/mp4"}
+# Codec yang dicoba berurutan per format; yang pertama bisa dibuka VideoWriter dipakai
+CLIP_CODECS = {"webm": ("VP80",), "mp4": ("avc1", "mp4v")}
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class FrameBuffer:
+    """Frame JPEG terbaru satu kamera: [(timestamp, bytes)], dibatasi umur dan total ukuran."""
+
+    def __init__(self, seconds=CLIP_PRE_SECONDS, max_bytes=CLIP_BUFFER_MAX_BYTES):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()
+        self.bytes = 0
+
+    def append(self, timestamp, jpeg):
+        self.frames.append((timestamp, jpeg))
+        self.bytes += len(jpeg)
+        while self.frames and (self.bytes > self.max_bytes or self.frames[0][0] < timestamp - self.seconds):
+            self.bytes -= len(self.frames.popleft()[1])
+
+    def snapshot(self):
+        return list(self.frames)
+
+
+class _Recording:
+    __slots__ = ("key", "device_id", "frames", "bytes", "started_at", "ends_at")
+
+    def __init__(self, key, device_id, frames, now, ends_at):
+        self.key = key
+        self.device_id = device_id
+        self.frames = frames
+        self.bytes = sum(len(jpeg) for _, jpeg in frames)
+        self.started_at = frames[0][0] if frames else now
+        self.ends_at = ends_at
+
+
+def clip_path(key, root=None):
+    return os.path.join(root or CLIP_DIR, *key.split("/"))
+
+
+def get_clip_path(key):
+    """Path klip yang sudah selesai ditulis, None jika belum ada (masih direkam/antre) atau dibuang."""
+    if not key:
+        return None
+    path = clip_path(key)
+    return path if os.path.exists(path) else None
+
+
+def _open_video_writer(path, fmt, fps, size):
+    import cv2
+    for codec in CLIP_CODECS[fmt]:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+        if writer.isOpened():
+            if codec == "mp4v":
+                logger.warning("OpenCV has no H.264 encoder, mp4 clips use mp4v and can only be downloaded; "
+                               "use CLIP_FORMAT=webm for clips that play in the browser")
+            return writer
+        writer.release()
+    raise RuntimeError(f"OpenCV cannot encode {fmt} clips (tried {', '.join(CLIP_CODECS[fmt])})")
+
+
+def encode_clip(frames, fmt=CLIP_FORMAT):
+    """frames: [(timestamp, jpeg)] -> bytes file klip."""
+    if fmt not in CLIP_CODECS:
+        return b"".join(jpeg for _, jpeg in frames)
+    import cv2
+    import tempfile
+    import numpy as np
+    duration = frames[-1][0] - frames[0][0]
+    fps = max(1.0, (len(frames) - 1) / duration) if duration > 0 else 10.0
+    first = cv2.imdecode(np.frombuffer(frames[0][1], dtype=np.uint8), cv2.IMREAD_COLOR)
+    h, w = first.shape[:2]
+    fd, tmp_path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        writer = _open_video_writer(tmp_path, fmt, fps, (w, h))
+        for _, jpeg in frames:
+            image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            if image.shape[:2] != (h, w):
+                # Resolusi berubah (adaptive control): VideoWriter butuh ukuran tetap
+                image = cv2.resize(image, (w, h))
+            writer.write(image)
+        writer.release()
+        with open(tmp_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(tmp_path)
+
+
+class ClipRecorder:
+    """Dipanggil dari thread producer: add_frame() untuk setiap frame yang dipublish,
+    trigger() saat ada deteksi. Keduanya hanya memindahkan referensi bytes di memori."""
+
+    def __init__(self, pre_seconds=CLIP_PRE_SECONDS, post_seconds=CLIP_POST_SECONDS,
+                 max_seconds=CLIP_MAX_SECONDS, max_bytes=CLIP_BUFFER_MAX_BYTES,
+                 max_queue=CLIP_QUEUE_SIZE, fmt=CLIP_FORMAT, root=None, on_discard=None):
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.fmt = fmt if fmt in CLIP_MIMETYPES else "mjpeg"
+        self.root = root or CLIP_DIR
+        self._buffers = {}
+        self._active = {}
+        self._seq = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        # Dipakai juga untuk menambah/menghapus isi _buffers dan _active (thread producer),
+        # supaya stats() dari thread request tidak melihat dict yang sedang berubah
+        self._lock = threading.Lock()
+        # on_discard(keys) dipanggil di thread writer untuk klip yang tidak akan pernah ada
+        self.on_discard = on_discard
+        self._discarded = deque(maxlen=256)  # cukup untuk track yang masih aktif
+        self._pending_discards = []
+        self._stats = {"started": 0, "written": 0, "dropped": 0, "failed": 0, "truncated": 0, "last_write_ms": 0.0}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="clip-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def add_frame(self, device_id, jpeg, now=None):
+        now = now if now is not None else time.time()
+        buffer = self._buffers.get(device_id)
+        if buffer is None:
+            buffer = FrameBuffer(self.pre_seconds, self.max_bytes)
+            with self._lock:
+                self._buffers[device_id] = buffer
+        buffer.append(now, jpeg)
+        recording = self._active.get(device_id)
+        if recording is None:
+            return
+        recording.frames.append((now, jpeg))
+        recording.bytes += len(jpeg)
+        if recording.bytes > self.max_bytes or now - recording.started_at > self.max_seconds:
+            with self._lock:
+                self._stats["truncated"] += 1
+            self._finish(device_id)
+        elif now >= recording.ends_at:
+            self._finish(device_id)
+
+    def trigger(self, device_id, now=None):
+        """Mulai (atau perpanjang) klip untuk device ini, return key klip untuk
+        disimpan di baris deteksi. File baru ada setelah klip selesai ditulis."""
+        now = now if now is not None else time.time()
+        recording = self._active.get(device_id)
+        if recording is not None:
+            recording.ends_at = now + self.post_seconds
+            return recording.key
+        self._seq += 1
+        started = datetime.fromtimestamp(now)
+        # Key relatif terhadap CLIP_DIR, disimpan di kolom detections.clip_key
+        key = f"{device_id}/{started:%Y%m%d}/{device_id}_{started:%H%M%S}_{self._seq}.{self.fmt}"
+        buffer = self._buffers.get(device_id)
+        recording = _Recording(key, device_id, buffer.snapshot() if buffer else [], now, now + self.post_seconds)
+        with self._lock:
+            self._active[device_id] = recording
+            self._stats["started"] += 1
+        return key
+
+    def is_discarded(self, key):
+        """True jika klip key ini dibuang atau gagal ditulis (key tidak perlu disimpan lagi)."""
+        with self._lock:
+            return key in self._discarded
+
+    def flush(self):
+        """Serahkan semua klip yang sedang direkam ke writer (shutdown)."""
+        for device_id in list(self._active):
+            self._finish(device_id)
+
+    def stop(self, timeout=10):
+        self.flush()
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error("Clip writer queue full during shutdown, pending clips may be lost")
+            return
+        self._thread.join(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["recording"] = len(self._active)
+            buffers = list(self._buffers.values())
+        stats["queue_depth"] = self._queue.qsize()
+        stats["buffered_bytes"] = sum(b.bytes for b in buffers)
+        stats["format"] = self.fmt
+        return stats
+
+    def _finish(self, device_id):
+        with self._lock:
+            recording = self._active.pop(device_id, None)
+        if recording is None or not recording.frames:
+            return
+        try:
+            self._queue.put_nowait(recording)
+        except queue.Full:
+            # Disk lambat: klip dibuang, loop video tidak ikut menunggu
+            self._discard(recording.key, "dropped")
+            logger.warning(f"Clip writer queue full, dropping clip {recording.key}")
+
+    def _discard(self, key, reason):
+        with self._lock:
+            self._stats[reason] += 1
+            self._discarded.append(key)
+            self._pending_discards.append(key)
+
+    def _report_discards(self):
+        with self._lock:
+            keys, self._pending_discards = self._pending_discards, []
+        if keys and self.on_discard is not None:
+            try:
+                self.on_discard(keys)
+            except Exception as e:
+                logger.error(f"Failed to clear keys of {len(keys)} discarded clip(s): {e}")
+
+    def _run(self):
+        while True:
+            try:
+                recording = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._report_discards()
+                continue
+            if recording is _STOP:
+                self._report_discards()
+                logger.info("Clip writer stopped")
+                return
+            start = time.time()
+            try:
+                _write_atomic(clip_path(recording.key, self.root), encode_clip(recording.frames, self.fmt))
+            except Exception as e:
+                self._discard(recording.key, "failed")
+                logger.error(f"Failed to write clip {recording.key}: {e}")
+                self._report_discards()
+                continue
+            elapsed_ms = (time.time() - start) * 1000
+            with self._lock:
+                self._stats["written"] += 1
+                self._stats["last_write_ms"] = elapsed_ms
+            logger.info(f"Clip {recording.key} written: {len(recording.frames)} frames, "
+                        f"{recording.frames[-1][0] - recording.frames[0][0]:.1f}s in {elapsed_ms:.1f}ms")
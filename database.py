@@ -1,11 +1,34 @@
-import mysql.connector
 from dotenv import load_dotenv
 import os
-from datetime import datetime
+import logging
+import threading
+from datetime import datetime, timedelta
+from db_pool import ConnectionPool
+from ttl_cache import TTLCache
 
 load_dotenv()
 
-def get_connection():
+# Konfigurasi
+DB_DRIVER = os.getenv('DB_DRIVER', 'mysql').lower()  # mysql | sqlite
+DB_SQLITE_PATH = os.getenv('DB_SQLITE_PATH', 'yolo_edge.sqlite3')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))  # 0 = tanpa pool
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', '5'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '300'))  # detik idle sebelum koneksi ditutup
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DASHBOARD_CACHE_TTL = float(os.getenv('DASHBOARD_CACHE_TTL', '2'))  # detik
+HEALTH_CACHE_TTL = float(os.getenv('HEALTH_CACHE_TTL', '5'))  # detik
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))  # baris per fetchmany saat export
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def connect_raw():
+    """Buka koneksi baru tanpa pool."""
+    if DB_DRIVER == 'sqlite':
+        import sqlite_compat
+        return sqlite_compat.connect(DB_SQLITE_PATH)
+    import mysql.connector
     return mysql.connector.connect(
         host=os.getenv('DB_HOST', 'localhost'),
         user=os.getenv('DB_USER', 'root'),
@@ -13,19 +36,313 @@ def get_connection():
         database=os.getenv('DB_NAME', 'yolo_edge')
     )
 
+def _reset_pool_after_fork():
+    # Proses anak (worker) tidak boleh memakai socket koneksi milik proses induk
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    connect_raw,
+                    size=DB_POOL_SIZE,
+                    max_overflow=DB_POOL_MAX_OVERFLOW,
+                    recycle=DB_POOL_RECYCLE,
+                    pre_ping=DB_POOL_PRE_PING,
+                    timeout=DB_POOL_TIMEOUT,
+                )
+    return _pool
+
+def get_connection():
+    if DB_POOL_SIZE <= 0:
+        return connect_raw()
+    return get_pool().acquire()
+
+# Cache dashboard di-invalidate oleh jalur insert deteksi; cache health oleh error database
+dashboard_cache = TTLCache(DASHBOARD_CACHE_TTL)
+health_cache = TTLCache(HEALTH_CACHE_TTL)
+
+def get_cache_stats():
+    return {"dashboard": dashboard_cache.stats(), "health": health_cache.stats()}
+
+def get_pool_stats():
+    if DB_POOL_SIZE <= 0 or _pool is None:
+        return None
+    return _pool.stats()
+
+# ==========================
+# Rollup (agregat per device dan per bucket menit/jam/hari)
+# ==========================
+HISTORY_BUCKETS = ("minute", "hour", "day")
+BUCKET_DELTAS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+# Bucket yang di-update setiap insert; bucket lain di /api/history dihitung dari index detections
+ROLLUP_BUCKETS = tuple(
+    b for b in os.getenv('ROLLUP_BUCKETS', 'minute,hour,day').replace(' ', '').split(',') if b in HISTORY_BUCKETS
+)
+
+if DB_DRIVER == 'sqlite':
+    _TOTALS_UPSERT = """
+        INSERT INTO detection_totals (device_id, total_detections, total_humans)
+        VALUES (%s, %s, %s)
+        ON CONFLICT(device_id) DO UPDATE SET
+            total_detections = total_detections + excluded.total_detections,
+            total_humans = total_humans + excluded.total_humans
+    """
+    _ROLLUP_UPSERT = """
+        INSERT INTO detection_rollups
+            (device_id, bucket_type, bucket_start, detections, human_total, human_max, delay_total, jitter_total)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT(device_id, bucket_type, bucket_start) DO UPDATE SET
+            detections = detections + excluded.detections,
+            human_total = human_total + excluded.human_total,
+            human_max = MAX(human_max, excluded.human_max),
+            delay_total = delay_total + excluded.delay_total,
+            jitter_total = jitter_total + excluded.jitter_total
+    """
+else:
+    _TOTALS_UPSERT = """
+        INSERT INTO detection_totals (device_id, total_detections, total_humans)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            total_detections = total_detections + VALUES(total_detections),
+            total_humans = total_humans + VALUES(total_humans)
+    """
+    _ROLLUP_UPSERT = """
+        INSERT INTO detection_rollups
+            (device_id, bucket_type, bucket_start, detections, human_total, human_max, delay_total, jitter_total)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            detections = detections + VALUES(detections),
+            human_total = human_total + VALUES(human_total),
+            human_max = GREATEST(human_max, VALUES(human_max)),
+            delay_total = delay_total + VALUES(delay_total),
+            jitter_total = jitter_total + VALUES(jitter_total)
+    """
+
+def bucket_start(timestamp, bucket_type):
+    if bucket_type == "minute":
+        return timestamp.replace(second=0, microsecond=0)
+    if bucket_type == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def apply_rollups(cursor, events):
+    """Tambahkan event ke detection_totals dan detection_rollups memakai cursor
+    (dan transaksi) milik pemanggil. human_total menjumlahkan human_count; human_max
+    memakai peak_count (orang terbanyak dalam satu frame) jika ada."""
+    totals = {}
+    buckets = {}
+    for e in events:
+        human_count = e["human_count"] or 0
+        peak = e.get("peak_count") or human_count
+        delay = e["delay"] or 0
+        jitter = e["jitter"] or 0
+        count, humans = totals.get(e["device_id"], (0, 0))
+        totals[e["device_id"]] = (count + 1, humans + human_count)
+        for bucket_type in ROLLUP_BUCKETS:
+            key = (e["device_id"], bucket_type, bucket_start(e["timestamp"], bucket_type))
+            agg = buckets.setdefault(key, [0, 0, 0, 0.0, 0.0])
+            agg[0] += 1
+            agg[1] += human_count
+            agg[2] = max(agg[2], peak)
+            agg[3] += delay
+            agg[4] += jitter
+    cursor.executemany(
+        _TOTALS_UPSERT,
+        [(device_id, count, humans) for device_id, (count, humans) in totals.items()]
+    )
+    cursor.executemany(
+        _ROLLUP_UPSERT,
+        [key + tuple(agg) for key, agg in buckets.items()]
+    )
+
+def _bucket_expr(bucket_type):
+    if DB_DRIVER == 'sqlite':
+        fmt = {"minute": "%Y-%m-%d %H:%M:00", "hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}[bucket_type]
+        return f"strftime('{fmt}', timestamp)"
+    fmt = {"minute": "%Y-%m-%d %H:%i:00", "hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}[bucket_type]
+    return f"DATE_FORMAT(timestamp, '{fmt}')"
+
+def rebuild_rollups():
+    """Hitung ulang seluruh rollup dari tabel detections (satu transaksi)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM detection_totals")
+        cursor.execute("DELETE FROM detection_rollups")
+        cursor.execute(
+            """
+            INSERT INTO detection_totals (device_id, total_detections, total_humans)
+            SELECT device_id, COUNT(*), COALESCE(SUM(human_count), 0)
+            FROM detections
+            GROUP BY device_id
+            """
+        )
+        for bucket_type in ROLLUP_BUCKETS:
+            expr = _bucket_expr(bucket_type)
+            cursor.execute(
+                f"""
+                INSERT INTO detection_rollups
+                    (device_id, bucket_type, bucket_start, detections, human_total, human_max, delay_total, jitter_total)
+                SELECT device_id, '{bucket_type}', {expr}, COUNT(*),
+                       COALESCE(SUM(human_count), 0), COALESCE(MAX(COALESCE(peak_count, human_count)), 0),
+                       COALESCE(SUM(delay_ms), 0), COALESCE(SUM(jitter), 0)
+                FROM detections
+                GROUP BY device_id, {expr}
+                """
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def verify_rollups():
+    """Bandingkan rollup dengan agregat dari detections. Return list selisih."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    mismatches = []
+    try:
+        cursor.execute(
+            """
+            SELECT device_id, COUNT(*), COALESCE(SUM(human_count), 0)
+            FROM detections
+            GROUP BY device_id
+            """
+        )
+        expected = {row[0]: (int(row[1]), int(row[2])) for row in cursor.fetchall()}
+        cursor.execute("SELECT device_id, total_detections, total_humans FROM detection_totals")
+        actual = {row[0]: (int(row[1]), int(row[2])) for row in cursor.fetchall()}
+        for device_id in sorted(set(expected) | set(actual)):
+            if expected.get(device_id, (0, 0)) != actual.get(device_id, (0, 0)):
+                mismatches.append(("totals", device_id, None, expected.get(device_id), actual.get(device_id)))
+
+        for bucket_type in ROLLUP_BUCKETS:
+            expr = _bucket_expr(bucket_type)
+            cursor.execute(
+                f"""
+                SELECT device_id, {expr}, COUNT(*), COALESCE(SUM(human_count), 0),
+                       COALESCE(MAX(COALESCE(peak_count, human_count)), 0)
+                FROM detections
+                GROUP BY device_id, {expr}
+                """
+            )
+            expected = {(row[0], str(row[1])): tuple(int(v) for v in row[2:]) for row in cursor.fetchall()}
+            cursor.execute(
+                """
+                SELECT device_id, bucket_start, detections, human_total, human_max
+                FROM detection_rollups
+                WHERE bucket_type = %s
+                """,
+                (bucket_type,)
+            )
+            actual = {(row[0], str(row[1])): tuple(int(v) for v in row[2:]) for row in cursor.fetchall()}
+            for key in sorted(set(expected) | set(actual)):
+                if expected.get(key) != actual.get(key):
+                    mismatches.append((bucket_type, key[0], key[1], expected.get(key), actual.get(key)))
+    finally:
+        cursor.close()
+        conn.close()
+    return mismatches
+
+def _history_point(row):
+    bucket, count, human_total, human_max, delay_total, jitter_total = row
+    count = int(count)
+    return {
+        # MySQL mengembalikan datetime, SQLite string 'YYYY-MM-DD HH:MM:SS'
+        "t": bucket.strftime("%Y-%m-%d %H:%M:%S") if hasattr(bucket, "strftime") else str(bucket),
+        "count": count,
+        "human_max": int(human_max),
+        "human_avg": round(float(human_total) / count, 2) if count else 0.0,
+        "delay_avg": round(float(delay_total) / count, 2) if count else 0.0,
+        "jitter_avg": round(float(jitter_total) / count, 2) if count else 0.0,
+    }
+
+def get_detection_history(device_id, bucket_type, start, end, after=None, limit=500):
+    """Deret waktu per bucket untuk satu device dalam [start, end), urut waktu.
+    Keyset pagination: after = bucket_start terakhir halaman sebelumnya.
+    Bucket di ROLLUP_BUCKETS dibaca dari primary key detection_rollups; selain itu
+    diagregasi dari detections lewat index (device_id, timestamp).
+    Bucket yang memuat start dan end ikut utuh (start dibulatkan ke bawah, end ke atas),
+    sama di kedua jalur.
+    Return (points, next_after) dengan next_after None jika sudah halaman terakhir."""
+    start = bucket_start(start, bucket_type)
+    if bucket_start(end, bucket_type) != end:
+        end = bucket_start(end, bucket_type) + BUCKET_DELTAS[bucket_type]
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        if bucket_type in ROLLUP_BUCKETS:
+            lower, lower_op = (after, ">") if after is not None else (start, ">=")
+            cursor.execute(
+                f"""
+                SELECT bucket_start, detections, human_total, human_max, delay_total, jitter_total
+                FROM detection_rollups
+                WHERE device_id = %s AND bucket_type = %s
+                  AND bucket_start {lower_op} %s AND bucket_start < %s
+                ORDER BY bucket_start
+                LIMIT %s
+                """,
+                (device_id, bucket_type, lower, end, limit + 1)
+            )
+        else:
+            lower = after + BUCKET_DELTAS[bucket_type] if after is not None else start
+            expr = _bucket_expr(bucket_type)
+            cursor.execute(
+                f"""
+                SELECT {expr} AS bucket, COUNT(*), COALESCE(SUM(human_count), 0),
+                       COALESCE(MAX(COALESCE(peak_count, human_count)), 0),
+                       COALESCE(SUM(delay_ms), 0), COALESCE(SUM(jitter), 0)
+                FROM detections
+                WHERE device_id = %s AND timestamp >= %s AND timestamp < %s
+                GROUP BY bucket
+                ORDER BY bucket
+                LIMIT %s
+                """,
+                (device_id, lower, end, limit + 1)
+            )
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    points = [_history_point(row) for row in rows[:limit]]
+    next_after = points[-1]["t"] if len(rows) > limit else None
+    return points, next_after
+
 def insert_detection(device_id, status, jitter, delay, human_count, image=None):
+    timestamp = datetime.now().replace(microsecond=0)
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO detections (device_id, status, jitter, delay_ms, human_count, image, timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s, NOW())
-        """,
-        (device_id, status, jitter, delay, human_count, image)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute(
+            """
+            INSERT INTO detections (device_id, status, jitter, delay_ms, human_count, image, timestamp)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            (device_id, status, jitter, delay, human_count, image, timestamp)
+        )
+        apply_rollups(cursor, [{
+            "device_id": device_id, "jitter": jitter, "delay": delay,
+            "human_count": human_count, "timestamp": timestamp,
+        }])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        health_cache.invalidate()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    dashboard_cache.invalidate(device_id)
 
 def update_device(device_id, status):
     conn = get_connection()
@@ -44,13 +361,32 @@ def update_device(device_id, status):
     cursor.close()
     conn.close()
 
+def update_device_status(statuses):
+    """statuses: {device_id: last_status}. Hanya status dan last_active, counter deteksi tidak berubah."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            """
+            UPDATE devices
+            SET last_status = %s,
+                last_active = NOW()
+            WHERE id = %s
+            """,
+            [(status, device_id) for device_id, status in statuses.items()]
+        )
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
 def get_dashboard_data(device_id):
     conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
     cursor.execute(
         """
-        SELECT id, timestamp, status, delay_ms as delay, jitter, human_count
+        SELECT id, timestamp, status, delay_ms as delay, jitter, human_count, peak_count, clip_key
         FROM detections
         WHERE device_id = %s
         ORDER BY timestamp DESC
@@ -60,22 +396,22 @@ def get_dashboard_data(device_id):
     )
     recent = cursor.fetchall()
 
+    # Total dari tabel rollup (di-update bersama setiap insert), bukan COUNT/SUM atas detections
     cursor.execute(
         """
-        SELECT 
-            COUNT(*) AS total_detections,
-            COALESCE(SUM(human_count), 0) AS total_humans
-        FROM detections
+        SELECT total_detections, total_humans
+        FROM detection_totals
         WHERE device_id = %s
         """,
         (device_id,)
     )
-    totals = cursor.fetchone()
+    totals = cursor.fetchone() or {}
 
     cursor.close()
     conn.close()
 
-    latest_count = recent[0]["human_count"] if recent else 0
+    # Event track menyimpan human_count = 1; jumlah orang di frame ada di peak_count
+    latest_count = (recent[0]["peak_count"] or recent[0]["human_count"]) if recent else 0
 
     return {
         "recent_detections": recent,
@@ -83,6 +419,23 @@ def get_dashboard_data(device_id):
         "human_count": latest_count
     }
 
+def get_dashboard_data_cached(device_id):
+    """get_dashboard_data dengan TTL pendek + single-flight."""
+    return dashboard_cache.get_or_load(device_id, lambda: get_dashboard_data(device_id))
+
+def check_database():
+    """True jika database bisa dihubungi. Hasil di-cache selama HEALTH_CACHE_TTL."""
+    def ping():
+        try:
+            conn = get_connection()
+            ok = conn.is_connected()
+            conn.close()
+            return ok
+        except Exception as e:
+            logging.error(f"Database connection error: {e}")
+            return False
+    return health_cache.get_or_load("database", ping)
+
 def get_detection_image(detection_id):
     conn = get_connection()
     cursor = conn.cursor()
@@ -96,3 +449,219 @@ def get_detection_image(detection_id):
     cursor.close()
     conn.close()
     return row[0] if row and row[0] is not None else None
+
+def get_detection_image_key(detection_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT image_key FROM detections WHERE id = %s
+        """,
+        (detection_id,)
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return row[0] if row else None
+
+def get_detection_clip_key(detection_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT clip_key FROM detections WHERE id = %s
+        """,
+        (detection_id,)
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return row[0] if row else None
+
+def clear_clip_keys(keys):
+    """Kosongkan clip_key baris yang klipnya dibuang atau gagal ditulis (clip_recorder),
+    supaya dashboard dan export tidak menunjuk file yang tidak pernah ada."""
+    if not keys:
+        return
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("UPDATE detections SET clip_key = NULL WHERE clip_key = %s", [(key,) for key in keys])
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    dashboard_cache.invalidate()
+
+def get_detection_image_batch(after_id, limit, sizes_only=False):
+    """Batch berikutnya (keyset by id) dari baris yang masih menyimpan LONGBLOB.
+    sizes_only=True: (id, ukuran bytes) tanpa membaca blob-nya (dry run migrasi)."""
+    column = "LENGTH(image)" if sizes_only else "image"
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        f"""
+        SELECT id, {column} FROM detections
+        WHERE id > %s AND image IS NOT NULL
+        ORDER BY id
+        LIMIT %s
+        """,
+        (after_id, limit)
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return rows
+
+def set_detection_image_keys(pairs):
+    """pairs: list of (detection_id, image_key). Kolom image dikosongkan di transaksi yang sama."""
+    if not pairs:
+        return
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(
+            """
+            UPDATE detections SET image_key = %s, image = NULL WHERE id = %s
+            """,
+            [(key, detection_id) for detection_id, key in pairs]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+EXPORT_COLUMNS = ("id", "device_id", "timestamp", "ended_at", "status", "human_count", "peak_count", "delay_ms",
+                  "jitter", "track_id", "image_key", "clip_key")
+
+def iter_detections(start=None, end=None, device_id=None, with_blobs=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Generator baris detections (dict, urut device_id, timestamp, id) untuk export berapa pun jumlahnya.
+    Memakai koneksi sendiri (bukan slot pool, export bisa lama) dan cursor unbuffered:
+    di MySQL baris di-stream dari server dan diambil per chunk_size lewat fetchmany,
+    jadi memori tetap konstan. Kolom image (LONGBLOB) hanya dibaca jika with_blobs;
+    tanpanya has_blob menandai baris yang snapshot-nya masih di database."""
+    columns = list(EXPORT_COLUMNS)
+    columns.append("image" if with_blobs else "image IS NOT NULL AS has_blob")
+    names = list(EXPORT_COLUMNS) + ["image" if with_blobs else "has_blob"]
+    where, params = [], []
+    if device_id is not None:
+        where.append("device_id = %s")
+        params.append(device_id)
+    if start is not None:
+        where.append("timestamp >= %s")
+        params.append(start)
+    if end is not None:
+        where.append("timestamp < %s")
+        params.append(end)
+    sql = f"SELECT {', '.join(columns)} FROM detections"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # Urutan idx_detections_device_time (InnoDB menyertakan id di index sekunder): baris
+    # di-stream langsung dari index, tanpa filesort yang harus membaca semua baris dulu
+    sql += " ORDER BY device_id, timestamp, id"
+
+    conn = connect_raw()
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute(sql, tuple(params))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(names, row))
+    finally:
+        # Export yang dihentikan di tengah (client putus) masih punya baris belum dibaca;
+        # menutup koneksi sudah cukup untuk membuangnya
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        conn.close()
+
+def get_devices():
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(
+        """
+        SELECT id, device_name, ip_address, stream_url
+        FROM devices
+        ORDER BY id
+        """
+    )
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return rows
+
+
+_autoinc_step = None
+
+
+def _auto_increment_step(cursor):
+    """auto_increment_increment server (1 kecuali replikasi multi-master), dibaca sekali."""
+    global _autoinc_step
+    if _autoinc_step is None:
+        if DB_DRIVER == 'sqlite':
+            _autoinc_step = 1
+        else:
+            cursor.execute("SELECT @@auto_increment_increment")
+            _autoinc_step = int(cursor.fetchone()[0])
+    return _autoinc_step
+
+
+def insert_detections_batch(events):
+    """Simpan banyak deteksi sekaligus dalam satu transaksi.
+    events: list of dict (device_id, status, jitter, delay, human_count, image, image_key, timestamp,
+    serta ended_at/track_id/peak_count opsional dari tracker dan clip_key dari clip_recorder).
+    Counter di tabel devices ikut di-update di transaksi yang sama.
+    Setelah commit, setiap event berisi "id" baris yang dibuat."""
+    if not events:
+        return
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        # executemany INSERT dikirim sebagai satu INSERT multi-row. InnoDB memberi id berurutan
+        # untuk satu INSERT dengan jumlah baris diketahui (semua innodb_autoinc_lock_mode), dan
+        # lastrowid adalah id baris pertama, jadi id setiap event = id pertama + offset * step
+        cursor.executemany(
+            """
+            INSERT INTO detections (device_id, status, jitter, delay_ms, human_count, image, image_key,
+                                    timestamp, ended_at, track_id, peak_count, clip_key)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            [(e["device_id"], e["status"], e["jitter"], e["delay"], e["human_count"],
+              e["image"], e.get("image_key"), e["timestamp"], e.get("ended_at"), e.get("track_id"),
+              e.get("peak_count"), e.get("clip_key")) for e in events]
+        )
+        first_id, step = cursor.lastrowid, _auto_increment_step(cursor)
+        for offset, e in enumerate(events):
+            e["id"] = first_id + offset * step
+        apply_rollups(cursor, events)
+        per_device = {}
+        for e in events:
+            count, _ = per_device.get(e["device_id"], (0, None))
+            per_device[e["device_id"]] = (count + 1, e["device_status"])
+        cursor.executemany(
+            """
+            UPDATE devices
+            SET total_human_detection = total_human_detection + %s,
+                last_status = %s,
+                last_active = NOW()
+            WHERE id = %s
+            """,
+            [(count, status, device_id) for device_id, (count, status) in per_device.items()]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        health_cache.invalidate()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    for device_id in per_device:
+        dashboard_cache.invalidate(device_id)
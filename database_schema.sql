@@ -17,6 +17,7 @@ CREATE TABLE IF NOT EXISTS devices (
     id INT AUTO_INCREMENT PRIMARY KEY,
     device_name VARCHAR(100) NOT NULL,
     ip_address VARCHAR(50),
+    stream_url VARCHAR(255) NULL,
     total_human_detection INT DEFAULT 0,
     last_status VARCHAR(50),
     last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
@@ -32,9 +33,59 @@ CREATE TABLE IF NOT EXISTS detections (
     delay_ms FLOAT,
     human_count INT DEFAULT 0,
     image LONGBLOB NULL,
+    image_key CHAR(64) NULL,
+    ended_at TIMESTAMP NULL,
+    track_id INT NULL,
+    peak_count INT NULL,
+    clip_key VARCHAR(255) NULL,
+    FOREIGN KEY (device_id) REFERENCES devices(id),
+    INDEX idx_detections_device_time (device_id, timestamp),
+    INDEX idx_detections_clip_key (clip_key)
+);
+
+-- Agregat yang di-update di transaksi yang sama dengan setiap insert deteksi,
+-- supaya dashboard tidak perlu COUNT/SUM atas seluruh tabel detections
+CREATE TABLE IF NOT EXISTS detection_totals (
+    device_id INT PRIMARY KEY,
+    total_detections BIGINT NOT NULL DEFAULT 0,
+    total_humans BIGINT NOT NULL DEFAULT 0,
+    FOREIGN KEY (device_id) REFERENCES devices(id)
+);
+
+CREATE TABLE IF NOT EXISTS detection_rollups (
+    device_id INT NOT NULL,
+    bucket_type VARCHAR(10) NOT NULL,   -- minute | hour | day (ROLLUP_BUCKETS)
+    bucket_start DATETIME NOT NULL,
+    detections INT NOT NULL DEFAULT 0,
+    human_total BIGINT NOT NULL DEFAULT 0,
+    human_max INT NOT NULL DEFAULT 0,
+    delay_total DOUBLE NOT NULL DEFAULT 0,
+    jitter_total DOUBLE NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_id, bucket_type, bucket_start),
     FOREIGN KEY (device_id) REFERENCES devices(id)
 );
 
+-- Untuk database lama (multi-kamera):
+-- ALTER TABLE devices ADD COLUMN stream_url VARCHAR(255) NULL AFTER ip_address;
+
+-- Snapshot di image store (IMAGE_STORAGE=file), untuk database lama:
+-- ALTER TABLE detections ADD COLUMN image_key CHAR(64) NULL AFTER image;
+-- lalu pindahkan blob lama: python migrate_images.py
+
+-- Rollup untuk database lama (tabel di atas dibuat otomatis oleh CREATE TABLE IF NOT EXISTS):
+-- ALTER TABLE detections ADD INDEX idx_detections_device_time (device_id, timestamp);
+-- lalu isi rollup dari data yang sudah ada: python rebuild_rollups.py
+
+-- Event per orang dari tracker (DETECTION_EVENTS=track), untuk database lama:
+-- ALTER TABLE detections ADD COLUMN ended_at TIMESTAMP NULL AFTER image_key, ADD COLUMN track_id INT NULL AFTER ended_at;
+-- human_count event track = 1 orang; jumlah orang terbanyak dalam satu frame disimpan terpisah:
+-- ALTER TABLE detections ADD COLUMN peak_count INT NULL AFTER track_id;
+-- lalu hitung ulang rollup: python rebuild_rollups.py
+
+-- Klip pra/pasca-event (CLIP_RECORDING=true), untuk database lama:
+-- ALTER TABLE detections ADD COLUMN clip_key VARCHAR(255) NULL AFTER track_id;
+-- ALTER TABLE detections ADD INDEX idx_detections_clip_key (clip_key);
+
 -- Data awal
 INSERT INTO devices (device_name, ip_address, total_human_detection, last_status)
 VALUES ('ESP32-CAM', '172.20.10.2', 0, 'inactive');
@@ -0,0 +1,174 @@
+"""
+Connection pool sederhana untuk database.py (size, max overflow, idle recycle, pre-ping)
+"""
+
+import time
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Proxy koneksi: semua atribut diteruskan ke koneksi asli,
+    close() mengembalikan koneksi ke pool alih-alih menutupnya."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._pool.release(self._raw)
+
+    def invalidate(self):
+        """Buang koneksi (misalnya setelah error jaringan) alih-alih mengembalikannya."""
+        if not self._closed:
+            self._closed = True
+            self._pool.discard(self._raw)
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=5, max_overflow=5, recycle=300, pre_ping=True, timeout=5):
+        self._connect = connect
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()  # (raw, returned_at); LIFO supaya koneksi panas dipakai ulang
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size + max_overflow)
+        self._total = 0
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "recycled": 0,
+            "ping_failures": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "checked_out": 0,
+            "wait_ms_total": 0.0,
+            "checkouts": 0,
+        }
+
+    def acquire(self):
+        start = time.time()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+        try:
+            raw = self._checkout_idle()
+            if raw is None:
+                raw = self._connect()
+                with self._lock:
+                    self._total += 1
+                    self._stats["created"] += 1
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["checked_out"] += 1
+            self._stats["checkouts"] += 1
+            self._stats["wait_ms_total"] += (time.time() - start) * 1000
+        return PooledConnection(self, raw)
+
+    def _checkout_idle(self):
+        while True:
+            try:
+                raw, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if self.recycle and time.time() - returned_at > self.recycle:
+                self._close_raw(raw)
+                with self._lock:
+                    self._stats["recycled"] += 1
+                continue
+            if self.pre_ping and not self._ping(raw):
+                self._close_raw(raw)
+                with self._lock:
+                    self._stats["ping_failures"] += 1
+                continue
+            with self._lock:
+                self._stats["reused"] += 1
+            return raw
+
+    def _ping(self, raw):
+        try:
+            return raw.is_connected()
+        except Exception:
+            return False
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._total -= 1
+
+    def release(self, raw):
+        try:
+            # Jangan wariskan transaksi yang belum selesai ke pemakai berikutnya
+            if getattr(raw, "in_transaction", False):
+                raw.rollback()
+            with self._lock:
+                keep = self._idle.qsize() < self.size
+            if keep:
+                self._idle.put((raw, time.time()))
+            else:
+                # Koneksi overflow ditutup saat dikembalikan
+                self._close_raw(raw)
+        except Exception as e:
+            logger.warning(f"Discarding broken pooled connection: {e}")
+            self._close_raw(raw)
+            with self._lock:
+                self._stats["discarded"] += 1
+        finally:
+            with self._lock:
+                self._stats["checked_out"] -= 1
+            self._slots.release()
+
+    def discard(self, raw):
+        self._close_raw(raw)
+        with self._lock:
+            self._stats["discarded"] += 1
+            self._stats["checked_out"] -= 1
+        self._slots.release()
+
+    def dispose(self):
+        while True:
+            try:
+                raw, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_raw(raw)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = self._total
+        stats["idle"] = self._idle.qsize()
+        stats["size"] = self.size
+        stats["max_overflow"] = self.max_overflow
+        checkouts = stats.pop("checkouts")
+        wait_total = stats.pop("wait_ms_total")
+        stats["avg_wait_ms"] = round(wait_total / checkouts, 3) if checkouts else 0.0
+        return stats
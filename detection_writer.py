@@ -0,0 +1,209 @@
+"""
+Write-behind queue untuk deteksi: insert ke database dilakukan di thread
+terpisah secara batch, sehingga loop video tidak pernah menunggu database.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+import cv2
+from dotenv import load_dotenv
+from database import insert_detections_batch, update_device_status
+from image_store import IMAGE_STORAGE, THUMBNAIL_ON_INSERT, put_image, put_thumbnail
+from metrics import DB_WRITE_TIME, DB_ERRORS
+
+load_dotenv()
+
+# Konfigurasi
+DB_WRITER_BATCH_SIZE = int(os.getenv("DB_WRITER_BATCH_SIZE", "50"))
+DB_WRITER_FLUSH_INTERVAL = float(os.getenv("DB_WRITER_FLUSH_INTERVAL", "1.0"))  # detik
+DB_WRITER_QUEUE_SIZE = int(os.getenv("DB_WRITER_QUEUE_SIZE", "1000"))
+DB_WRITER_BLOCK_TIMEOUT = float(os.getenv("DB_WRITER_BLOCK_TIMEOUT", "0"))  # 0 = langsung drop jika penuh
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def make_event(device_id, status, jitter, delay, human_count, image=None, device_status="DETECTED",
+               timestamp=None, ended_at=None, track_id=None, clip_key=None, peak_count=None):
+    return {
+        "device_id": device_id,
+        "status": status,
+        "jitter": jitter,
+        "delay": delay,
+        "human_count": human_count,
+        "image": image,
+        "device_status": device_status,
+        "timestamp": timestamp or datetime.now().replace(microsecond=0),
+        "ended_at": ended_at,
+        "track_id": track_id,
+        "peak_count": peak_count,
+        "clip_key": clip_key,
+    }
+
+
+class DetectionWriter:
+    def __init__(self, batch_size=DB_WRITER_BATCH_SIZE, flush_interval=DB_WRITER_FLUSH_INTERVAL,
+                 max_queue=DB_WRITER_QUEUE_SIZE, block_timeout=DB_WRITER_BLOCK_TIMEOUT,
+                 write_batch=insert_detections_batch, on_flush=None):
+        self.batch_size = batch_size
+        self.on_flush = on_flush  # dipanggil dengan list event yang sudah tersimpan
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.write_batch = write_batch
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0, "last_flush_ms": 0.0}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="detection-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, device_id, status, jitter, delay, human_count, image=None, device_status="DETECTED",
+               timestamp=None, ended_at=None, track_id=None, clip_key=None, peak_count=None):
+        """Masukkan deteksi ke antrean. image boleh bytes JPEG atau frame numpy
+        (di-encode di thread writer). Event dari tracker membawa timestamp (masuk),
+        ended_at (keluar), track_id dan peak_count; clip_key menunjuk klip pra/pasca-event. Return False jika antrean penuh dan event dibuang."""
+        event = make_event(device_id, status, jitter, delay, human_count, image, device_status,
+                           timestamp, ended_at, track_id, clip_key, peak_count)
+        try:
+            if self.block_timeout > 0:
+                self._queue.put(event, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            logger.warning(f"Detection writer queue full, dropping event for device {device_id}")
+            return False
+        with self._lock:
+            self._stats["submitted"] += 1
+        return True
+
+    def submit_status(self, device_id, status):
+        """Perbarui devices.last_status/last_active tanpa baris deteksi (orang masuk,
+        track belum selesai). Ikut antrean yang sama supaya urutannya terjaga."""
+        try:
+            self._queue.put_nowait({"device_id": device_id, "device_status": status, "status_only": True})
+        except queue.Full:
+            logger.warning(f"Detection writer queue full, dropping status update for device {device_id}")
+            return False
+        return True
+
+    def write_now(self, events):
+        """Tulis event langsung di thread pemanggil (tanpa antrean), dipakai benchmark.py."""
+        self._flush(events)
+
+    def stop(self, timeout=10):
+        """Flush sisa antrean lalu hentikan worker."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error("Detection writer queue full during shutdown, pending events may be lost")
+            return
+        self._thread.join(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def _run(self):
+        while True:
+            batch = []
+            stopping = False
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                stopping = True
+            else:
+                batch.append(item)
+                # Kumpulkan event lain sampai batch penuh atau flush_interval habis
+                deadline = time.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+            if stopping:
+                # Drain semua yang tersisa sebelum berhenti
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            for i in range(0, len(batch), self.batch_size):
+                self._flush(batch[i:i + self.batch_size])
+            if stopping:
+                logger.info("Detection writer stopped")
+                return
+
+    def _flush(self, batch):
+        statuses = {e["device_id"]: e["device_status"] for e in batch if e.get("status_only")}
+        if statuses:
+            try:
+                update_device_status(statuses)
+            except Exception as e:
+                logger.error(f"Database error while updating status of {len(statuses)} device(s): {e}")
+                DB_ERRORS.inc()
+            batch = [e for e in batch if not e.get("status_only")]
+        if not batch:
+            return
+        for event in batch:
+            image = event["image"]
+            if image is not None and not isinstance(image, (bytes, bytearray)):
+                _, buf = cv2.imencode('.jpg', image)
+                image = buf.tobytes()
+                event["image"] = image
+            if image is not None and IMAGE_STORAGE == "file":
+                # Simpan file di image store, baris hanya menyimpan key-nya
+                try:
+                    event["image_key"] = put_image(image)
+                    event["image"] = None
+                    if THUMBNAIL_ON_INSERT:
+                        put_thumbnail(event["image_key"], image)
+                except OSError as e:
+                    logger.error(f"Image store write failed, keeping snapshot in database: {e}")
+        start = time.time()
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            logger.error(f"Database error while writing {len(batch)} detections: {e}")
+            DB_ERRORS.inc()
+            with self._lock:
+                self._stats["failed"] += len(batch)
+            return
+        elapsed_ms = (time.time() - start) * 1000
+        DB_WRITE_TIME.observe(elapsed_ms / 1000)
+        with self._lock:
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+        logger.info(f"Detection writer flushed {len(batch)} events in {elapsed_ms:.1f}ms")
+        if self.on_flush is not None:
+            try:
+                self.on_flush(batch)
+            except Exception as e:
+                logger.error(f"Detection writer on_flush callback failed: {e}")
@@ -0,0 +1,167 @@
+"""
+Export detections dalam jumlah besar secara streaming (NDJSON, CSV, atau Parquet
+jika pyarrow terpasang). Baris dibaca lewat database.iter_detections (cursor
+unbuffered, fetch per chunk), ditulis per baris/chunk, sehingga memori tetap
+konstan untuk jutaan baris. Dipakai CLI ini dan endpoint /api/export.
+
+    python export_detections.py --format ndjson --start 2026-09-01 --end 2026-10-01 -o september.ndjson
+    python export_detections.py --format parquet --device 1 -o device1.parquet
+    python export_detections.py --format csv --images inline > semua.csv
+
+Gambar: none (tanpa kolom gambar), ref (default: URL /detection_image/<id>, plus
+image_key dan clip_key), inline (base64 JPEG, jauh lebih besar).
+"""
+
+import io
+import os
+import sys
+import csv
+import json
+import base64
+import argparse
+from datetime import datetime
+from database import iter_detections, EXPORT_COLUMNS, EXPORT_CHUNK_SIZE
+from image_store import get_image
+
+EXPORT_FORMATS = ("ndjson", "csv", "parquet")
+IMAGE_MODES = ("none", "ref", "inline")
+# Dengan gambar inline satu chunk bisa berisi ratusan JPEG, jadi chunk diperkecil
+INLINE_CHUNK_SIZE = 100
+
+EXPORT_MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def _as_text(value):
+    # MySQL mengembalikan datetime, SQLite string
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def export_fields(images="ref"):
+    fields = list(EXPORT_COLUMNS)
+    if images == "ref":
+        fields.append("image_url")
+    elif images == "inline":
+        fields.append("image_base64")
+    if images == "none":
+        fields = [f for f in fields if f not in ("image_key", "clip_key")]
+    return fields
+
+
+def export_rows(start=None, end=None, device_id=None, images="ref", chunk_size=EXPORT_CHUNK_SIZE):
+    """Generator dict per baris, siap diserialisasi (datetime sudah menjadi string)."""
+    inline = images == "inline"
+    if inline:
+        chunk_size = min(chunk_size, INLINE_CHUNK_SIZE)
+    fields = export_fields(images)
+    for row in iter_detections(start, end, device_id, with_blobs=inline, chunk_size=chunk_size):
+        out = {name: _as_text(row.get(name)) for name in fields if name in row}
+        if images == "ref":
+            has_image = row["image_key"] or row["has_blob"]
+            out["image_url"] = f"/detection_image/{row['id']}" if has_image else None
+        elif inline:
+            data = row["image"] if row["image"] is not None else (get_image(row["image_key"]) if row["image_key"] else None)
+            out["image_base64"] = base64.b64encode(bytes(data)).decode("ascii") if data else None
+        yield out
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def iter_csv(rows, fields, flush_every=500):
+    """Potongan teks CSV (header lalu baris), di-flush setiap flush_every baris."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore")
+    writer.writeheader()
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % flush_every == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def write_parquet(rows, fields, path, row_group_size=EXPORT_CHUNK_SIZE):
+    """Tulis per row group supaya memori tetap sebesar satu row group. Butuh pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet export needs pyarrow: pip install pyarrow")
+    types = {
+        "id": pa.int64(), "device_id": pa.int32(), "timestamp": pa.timestamp("s"), "ended_at": pa.timestamp("s"),
+        "status": pa.string(), "human_count": pa.int32(), "peak_count": pa.int32(), "delay_ms": pa.float64(),
+        "jitter": pa.float64(), "track_id": pa.int32(), "image_key": pa.string(), "clip_key": pa.string(), "image_url": pa.string(),
+        "image_base64": pa.string(),
+    }
+    schema = pa.schema([(name, types[name]) for name in fields])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            for name in ("timestamp", "ended_at"):
+                if isinstance(row.get(name), str):
+                    row[name] = datetime.fromisoformat(row[name])
+            batch.append(row)
+            if len(batch) >= row_group_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export(fmt, out, start=None, end=None, device_id=None, images="ref", chunk_size=EXPORT_CHUNK_SIZE):
+    """Tulis export ke out (path, atau '-' untuk stdout). Return jumlah baris."""
+    fields = export_fields(images)
+    rows = export_rows(start, end, device_id, images, chunk_size)
+    if fmt == "parquet":
+        if out == "-":
+            raise SystemExit("Parquet export needs an output file (-o)")
+        return write_parquet(rows, fields, out, chunk_size)
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    chunks = iter_ndjson(counted(rows)) if fmt == "ndjson" else iter_csv(counted(rows), fields)
+    f = sys.stdout if out == "-" else open(out, "w", newline="", encoding="utf-8")
+    try:
+        for chunk in chunks:
+            f.write(chunk)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return count
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream detections to NDJSON, CSV or Parquet")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    parser.add_argument("--start", help="Only rows with timestamp >= START (ISO 8601)")
+    parser.add_argument("--end", help="Only rows with timestamp < END (ISO 8601)")
+    parser.add_argument("--device", type=int, help="Only this device_id")
+    parser.add_argument("--images", choices=IMAGE_MODES, default="ref",
+                        help="none: no image columns, ref: /detection_image URL, inline: base64 JPEG")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="Rows per fetch from the database")
+    args = parser.parse_args()
+
+    total = export(args.format, args.output, _parse_time(args.start), _parse_time(args.end), args.device,
+                   args.images, args.chunk_size)
+    if args.output != "-":
+        print(f"Exported {total} detection(s) to {os.path.abspath(args.output)}")
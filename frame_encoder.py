@@ -0,0 +1,96 @@
+"""
+Tahap encode frame: setiap frame output di-encode ke JPEG paling banyak sekali,
+dan buffer yang sama dipakai untuk stream MJPEG dan snapshot database.
+JPEG asli dari kamera diteruskan apa adanya jika frame tidak dianotasi.
+Memakai libjpeg-turbo (PyTurboJPEG) jika tersedia, selain itu OpenCV.
+"""
+
+import os
+import logging
+import threading
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfigurasi
+JPEG_ENCODER = os.getenv("JPEG_ENCODER", "auto").lower()  # auto | opencv | turbojpeg
+
+logger = logging.getLogger(__name__)
+
+_turbo = None
+if JPEG_ENCODER in ("auto", "turbojpeg"):
+    try:
+        from turbojpeg import TurboJPEG
+        _turbo = TurboJPEG()
+        logger.info("Using libjpeg-turbo (PyTurboJPEG) for JPEG encode/decode")
+    except Exception as e:
+        if JPEG_ENCODER == "turbojpeg":
+            logger.warning(f"TurboJPEG not available, falling back to OpenCV: {e}")
+
+_stats = {"encoded": 0, "decoded": 0, "passthrough": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def encoder_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["backend"] = "turbojpeg" if _turbo is not None else "opencv"
+    return stats
+
+
+def encode_jpeg(image, quality=95):
+    _count("encoded")
+    if _turbo is not None:
+        return _turbo.encode(image, quality=quality)
+    _, buf = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes()
+
+
+def decode_jpeg(data):
+    _count("decoded")
+    if _turbo is not None:
+        return _turbo.decode(data)
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+class FramePacket:
+    """Satu frame dalam bentuk pixel (numpy) dan/atau JPEG. Masing-masing bentuk
+    dibuat dari yang lain hanya saat dibutuhkan, dan paling banyak sekali."""
+
+    __slots__ = ("_image", "_jpeg", "_quality")
+
+    def __init__(self, image=None, jpeg=None):
+        self._image = image
+        self._jpeg = jpeg
+        self._quality = None
+
+    @property
+    def image(self):
+        if self._image is None and self._jpeg is not None:
+            self._image = decode_jpeg(self._jpeg)
+        return self._image
+
+    @property
+    def has_jpeg(self):
+        return self._jpeg is not None
+
+    def detach(self):
+        """Packet yang aman disimpan melewati iterasi pipeline saat ini."""
+        return self
+
+    def jpeg(self, quality=95):
+        """Bytes JPEG frame ini. JPEG dari kamera diteruskan tanpa re-encode."""
+        if self._jpeg is not None:
+            if self._quality is None:
+                _count("passthrough")
+            return self._jpeg
+        self._jpeg = encode_jpeg(self._image, quality)
+        self._quality = quality
+        return self._jpeg
@@ -0,0 +1,164 @@
+"""
+Penyimpanan snapshot deteksi di disk, content-addressed (SHA-256) dan di-shard
+per dua level direktori: <root>/ab/cd/abcd....jpg. Tabel detections cukup
+menyimpan key-nya (kolom image_key). Thumbnail disimpan di sebelahnya
+(<key>_thumb.jpg), dan ImageCache menahan gambar yang sering diminta di memori.
+"""
+
+import os
+import hashlib
+import tempfile
+import logging
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfigurasi
+IMAGE_STORAGE = os.getenv("IMAGE_STORAGE", "file").lower()  # file | db (LONGBLOB lama)
+IMAGE_STORE_DIR = os.path.abspath(os.getenv("IMAGE_STORE_DIR", "detection_images"))
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "160"))  # px, 2x dari lebar thumbnail di tabel
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "70"))
+THUMBNAIL_ON_INSERT = os.getenv("THUMBNAIL_ON_INSERT", "true").lower() == "true"
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+logger = logging.getLogger(__name__)
+
+
+def image_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def key_path(key, root=None, suffix=""):
+    root = root or IMAGE_STORE_DIR
+    return os.path.join(root, key[:2], key[2:4], f"{key}{suffix}.jpg")
+
+
+def put_image(data, root=None):
+    """Simpan bytes JPEG, return key. Konten yang sama hanya ditulis sekali."""
+    key = image_key(data)
+    path = key_path(key, root)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    return key
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Tulis ke file sementara lalu rename supaya pembaca tidak pernah melihat file setengah jadi
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def get_image_path(key, root=None):
+    """Path file untuk key, atau None jika tidak ada di store."""
+    if not key:
+        return None
+    path = key_path(key, root)
+    return path if os.path.exists(path) else None
+
+
+def get_image(key, root=None):
+    path = get_image_path(key, root)
+    if path is None:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def make_thumbnail(data, width=None, quality=None):
+    """Perkecil JPEG ke lebar tertentu (aspect ratio tetap)."""
+    width = width or THUMBNAIL_WIDTH
+    quality = quality or THUMBNAIL_QUALITY
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    if w > width:
+        img = cv2.resize(img, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes() if ok else None
+
+
+def put_thumbnail(key, data, root=None):
+    """Buat dan simpan thumbnail untuk gambar yang sudah ada di store."""
+    path = key_path(key, root, "_thumb")
+    if os.path.exists(path):
+        return path
+    thumb = make_thumbnail(data)
+    if thumb is None:
+        return None
+    _write_atomic(path, thumb)
+    return path
+
+
+def get_thumbnail(key, root=None):
+    """Bytes thumbnail untuk key; dibuat (dan disimpan) saat pertama kali diminta."""
+    if not key:
+        return None
+    path = key_path(key, root, "_thumb")
+    if not os.path.exists(path):
+        data = get_image(key, root)
+        if data is None or put_thumbnail(key, data, root) is None:
+            return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ImageCache:
+    """LRU in-process dengan batas total byte (bukan jumlah item)."""
+
+    def __init__(self, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._items[key] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
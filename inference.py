@@ -0,0 +1,286 @@
+"""
+Backend inferensi YOLO: PyTorch, ONNX Runtime atau OpenVINO (FP32/INT8).
+Model diekspor sekali dari MODEL_PATH lalu di-cache, dan di-warmup saat startup.
+
+    python inference.py export                  # ekspor/cek cache untuk konfigurasi .env
+    python inference.py verify --images DIR     # bandingkan hasil backend dengan PyTorch
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import tempfile
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from ultralytics import YOLO
+
+load_dotenv()
+
+# Konfigurasi
+MODEL_PATH = os.getenv("MODEL_PATH", "best.pt")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "pytorch").lower()  # pytorch | onnx | openvino
+INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp32").lower()  # fp32 | int8
+INFERENCE_IMGSZ = int(os.getenv("INFERENCE_IMGSZ", "640"))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))  # 0 = default runtime
+INFERENCE_WARMUP = int(os.getenv("INFERENCE_WARMUP", "2"))
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", "model_cache")
+INT8_CALIBRATION_DATA = os.getenv("INT8_CALIBRATION_DATA", "")  # dataset yaml untuk INT8 OpenVINO
+
+# Parameter deteksi yang sama untuk semua backend
+DETECT_CONF = 0.2
+DETECT_IOU = 0.45
+DETECT_MAX_DET = 10
+
+logger = logging.getLogger(__name__)
+
+
+def configure_threads(threads=INFERENCE_THREADS):
+    """Batasi thread PyTorch dan OpenCV. Sesi ONNX Runtime/OpenVINO dibuat ultralytics
+    tanpa opsi thread, jadi untuk backend itu batasnya dipasang apply_runtime_threads()."""
+    if threads <= 0:
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+
+def apply_runtime_threads(model, threads=INFERENCE_THREADS):
+    """Buat ulang sesi ONNX Runtime (SessionOptions.intra_op_num_threads) atau model
+    OpenVINO (INFERENCE_NUM_THREADS) dengan batas thread. Sesi baru ada setelah
+    inferensi pertama, jadi dipanggil predict()/warmup(); berikutnya tidak melakukan apa-apa."""
+    if threads <= 0 or getattr(model, "_runtime_threads", None) == threads:
+        return
+    backend = getattr(getattr(model, "predictor", None), "model", None)
+    if backend is None:
+        return
+    model._runtime_threads = threads
+    try:
+        if getattr(backend, "session", None) is not None:
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            backend.session = ort.InferenceSession(str(model.ckpt_path), sess_options=options,
+                                                   providers=backend.session.get_providers())
+        elif getattr(backend, "ov_compiled_model", None) is not None:
+            import openvino as ov
+            compiled = backend.ov_compiled_model
+            backend.ov_compiled_model = ov.Core().compile_model(
+                compiled.get_runtime_model(), device_name="CPU",
+                config={"PERFORMANCE_HINT": compiled.get_property("PERFORMANCE_HINT"),
+                        "INFERENCE_NUM_THREADS": threads})
+        else:
+            return
+        logger.info(f"Inference runtime limited to {threads} thread(s)")
+    except Exception as e:
+        logger.warning(f"Could not apply INFERENCE_THREADS to the inference runtime: {e}")
+
+
+def _export_target(backend, precision, imgsz):
+    base = os.path.splitext(os.path.basename(MODEL_PATH))[0]
+    suffix = f"{base}_{imgsz}_{precision}"
+    if backend == "onnx":
+        return os.path.join(MODEL_EXPORT_DIR, f"{suffix}.onnx")
+    return os.path.join(MODEL_EXPORT_DIR, f"{suffix}_openvino_model")
+
+
+def _meta_path(target):
+    return target.rstrip("/\\") + ".meta.json"
+
+
+def _cache_valid(target, imgsz, precision):
+    if not os.path.exists(target) or not os.path.exists(_meta_path(target)):
+        return False
+    try:
+        with open(_meta_path(target)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (
+        meta.get("source_mtime") == os.path.getmtime(MODEL_PATH)
+        and meta.get("imgsz") == imgsz
+        and meta.get("precision") == precision
+    )
+
+
+def _quantize_onnx(src, dst):
+    # INT8 dinamis (bobot INT8, aktivasi dikuantisasi saat runtime), tanpa dataset kalibrasi
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+
+
+def export_model(backend=INFERENCE_BACKEND, precision=INFERENCE_PRECISION, imgsz=INFERENCE_IMGSZ, force=False):
+    """Ekspor MODEL_PATH ke backend tujuan (sekali), return path model hasil ekspor."""
+    if backend == "pytorch":
+        return MODEL_PATH
+    if backend not in ("onnx", "openvino"):
+        raise ValueError(f"Unknown INFERENCE_BACKEND: {backend}")
+    target = _export_target(backend, precision, imgsz)
+    if not force and _cache_valid(target, imgsz, precision):
+        logger.info(f"Using cached {backend} model: {target}")
+        return target
+
+    os.makedirs(MODEL_EXPORT_DIR, exist_ok=True)
+    logger.info(f"Exporting {MODEL_PATH} to {backend} ({precision}, imgsz={imgsz})...")
+    start = time.time()
+    # ultralytics menulis hasil ekspor di samping file .pt; ekspor dari salinan di
+    # direktori sementara dalam cache supaya tidak ada file sisa di samping MODEL_PATH
+    workdir = tempfile.mkdtemp(dir=MODEL_EXPORT_DIR, prefix=".export_")
+    try:
+        source_copy = os.path.join(workdir, os.path.basename(MODEL_PATH))
+        shutil.copy2(MODEL_PATH, source_copy)
+        source = YOLO(source_copy)
+        if backend == "onnx":
+            # dynamic=True supaya batch multi-kamera dan imgsz adaptif tetap bisa dipakai
+            exported = source.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+            if precision == "int8":
+                _quantize_onnx(exported, target)
+            else:
+                shutil.move(exported, target)
+        else:
+            kwargs = {"format": "openvino", "imgsz": imgsz, "dynamic": True}
+            if precision == "int8":
+                kwargs["int8"] = True
+                if INT8_CALIBRATION_DATA:
+                    kwargs["data"] = INT8_CALIBRATION_DATA
+            exported = source.export(**kwargs)
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            shutil.move(exported, target)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(_meta_path(target), "w") as f:
+        json.dump({
+            "source": MODEL_PATH,
+            "source_mtime": os.path.getmtime(MODEL_PATH),
+            "imgsz": imgsz,
+            "precision": precision,
+            "backend": backend,
+        }, f)
+    logger.info(f"Exported {target} in {time.time() - start:.1f}s")
+    return target
+
+
+def warmup(model, imgsz=INFERENCE_IMGSZ, runs=INFERENCE_WARMUP):
+    """Jalankan beberapa inferensi dummy supaya inisialisasi lazy tidak dibayar request pertama."""
+    if runs <= 0:
+        return
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    start = time.time()
+    for _ in range(runs):
+        model(dummy, imgsz=imgsz, verbose=False)
+        apply_runtime_threads(model)
+    logger.info(f"Model warmup: {runs} run(s) in {(time.time() - start) * 1000:.0f}ms")
+
+
+def load_model(backend=INFERENCE_BACKEND, precision=INFERENCE_PRECISION, imgsz=INFERENCE_IMGSZ, do_warmup=True):
+    configure_threads()
+    path = export_model(backend, precision, imgsz)
+    model = YOLO(path, task="detect") if backend != "pytorch" else YOLO(path)
+    logger.info(f"Inference backend: {backend} ({precision}), imgsz={imgsz}, model={path}")
+    if do_warmup:
+        warmup(model, imgsz)
+    return model
+
+
+def person_class_ids(model):
+    """Class id "person" / "human" dari model (kosong = semua kelas dihitung)."""
+    try:
+        ids = [i for i, n in model.names.items() if str(n).strip().lower() in ["person", "human"]]
+        logger.info(f"Model classes: {model.names}")
+        logger.info(f"Person class IDs: {ids}")
+        return ids
+    except Exception as e:
+        logger.warning(f"Error getting class IDs: {e}")
+        return []
+
+
+def predict(model, frames, classes=None, imgsz=INFERENCE_IMGSZ):
+    """Satu panggilan model untuk satu frame atau list frame (batch)."""
+    results = model(
+        frames,
+        imgsz=imgsz,
+        conf=DETECT_CONF,
+        iou=DETECT_IOU,
+        max_det=DETECT_MAX_DET,
+        classes=classes,
+        verbose=False
+    )
+    apply_runtime_threads(model)
+    return results
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _person_boxes(result, classes):
+    boxes = result.boxes
+    xyxy = boxes.xyxy.cpu().numpy()
+    conf = boxes.conf.cpu().numpy()
+    cls = boxes.cls.cpu().numpy().astype(int)
+    keep = np.isin(cls, classes) if classes else np.ones(len(cls), dtype=bool)
+    order = np.argsort(-conf[keep])
+    return xyxy[keep][order], conf[keep][order]
+
+
+def verify_backend(image_dir, iou_tol=0.9, conf_tol=0.05):
+    """Bandingkan deteksi person backend terkonfigurasi dengan PyTorch pada folder gambar."""
+    import cv2
+    reference = load_model("pytorch", "fp32", INFERENCE_IMGSZ, do_warmup=False)
+    candidate = load_model(do_warmup=False)
+    classes = person_class_ids(reference)
+    failures = 0
+    files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    for name in files:
+        frame = cv2.imread(os.path.join(image_dir, name))
+        if frame is None:
+            continue
+        ref_boxes, ref_conf = _person_boxes(predict(reference, frame, classes or None)[0], classes)
+        cand_boxes, cand_conf = _person_boxes(predict(candidate, frame, classes or None)[0], classes)
+        ok = len(ref_boxes) == len(cand_boxes)
+        if ok:
+            for rb, rc in zip(ref_boxes, ref_conf):
+                best = max(range(len(cand_boxes)), key=lambda i: _iou(rb, cand_boxes[i]))
+                if _iou(rb, cand_boxes[best]) < iou_tol or abs(rc - cand_conf[best]) > conf_tol:
+                    ok = False
+                    break
+        if not ok:
+            failures += 1
+            print(f"MISMATCH {name}: pytorch={len(ref_boxes)} boxes, {INFERENCE_BACKEND}={len(cand_boxes)} boxes")
+    print(f"\nChecked {len(files)} image(s), {failures} mismatch(es)")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export and verify YOLO inference backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="Export MODEL_PATH for INFERENCE_BACKEND (cached)")
+    exp.add_argument("--force", action="store_true")
+    ver = sub.add_parser("verify", help="Compare INFERENCE_BACKEND results with PyTorch")
+    ver.add_argument("--images", required=True)
+    ver.add_argument("--iou-tol", type=float, default=0.9)
+    ver.add_argument("--conf-tol", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(export_model(force=args.force))
+    else:
+        sys.exit(0 if verify_backend(args.images, args.iou_tol, args.conf_tol) else 1)
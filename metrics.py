@@ -0,0 +1,222 @@
+"""
+Registry metrik in-process dengan format teks Prometheus untuk /metrics.
+Tanpa dependency tambahan: Counter, Gauge dan Histogram berlabel, plus metrik
+callback yang membaca counter yang sudah ada (FrameHub.dropped, statistik writer, ...).
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    body = ",".join(
+        f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+        for k, v in labels.items()
+    )
+    return "{" + body + "}"
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return dict(zip(self.labelnames, key))
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            if not self.labelnames:
+                self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(k), v) for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        out = []
+        for key, counts, total, count in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                out.append((self.name + "_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            out.append((self.name + "_sum", labels, total))
+            out.append((self.name + "_count", labels, count))
+        return out
+
+
+class CallbackMetric(_Metric):
+    """Nilai dibaca saat /metrics di-scrape. fn() -> {tuple nilai label: nilai} atau angka (tanpa label)."""
+
+    def __init__(self, name, documentation, metric_type, fn, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.type = metric_type
+        self.fn = fn
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            return [(self.name, {}, values)]
+        return [(self.name, self._labels(tuple(str(v) for v in (k if isinstance(k, tuple) else (k,)))), v)
+                for k, v in values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        # Nama yang sama menggantikan metrik lama (mis. callback milik pipeline baru)
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def reset_after_fork(self):
+        """Dipanggil di proses hasil fork: nilai dan callback warisan proses induk
+        bukan milik proses ini (callback membaca salinan objek induk) dan akan
+        terhitung dua kali jika ikut dikirim balik ke induk."""
+        with self._lock:
+            self._metrics = {name: metric for name, metric in self._metrics.items()
+                             if not isinstance(metric, CallbackMetric)}
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, metric_type, fn, labelnames=()):
+        return self.register(CallbackMetric(name, documentation, metric_type, fn, labelnames))
+
+    def collect(self):
+        """[(name, type, help, samples)], bisa di-pickle (dikirim worker di mode process)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                # Callback yang gagal (mis. objek sudah dimatikan) tidak boleh menggagalkan scrape
+                continue
+            families.append((metric.name, metric.type, metric.documentation, samples))
+        return families
+
+    def render(self, extra=()):
+        """Format teks Prometheus. extra: hasil collect() proses lain. Counter/histogram
+        dengan nama dan label yang sama dijumlahkan antar proses; gauge tidak (jumlah
+        dua kedalaman queue tidak berarti apa-apa), nilai dari extra yang dipakai."""
+        merged = {}
+        for name, metric_type, documentation, samples in list(self.collect()) + list(extra):
+            family = merged.setdefault(name, (metric_type, documentation, {}))[2]
+            for sample_name, labels, value in samples:
+                key = (sample_name, tuple(labels.items()))
+                family[key] = value if metric_type == "gauge" else family.get(key, 0) + value
+        lines = []
+        for name, (metric_type, documentation, samples) in merged.items():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for (sample_name, labels), value in samples.items():
+                lines.append(f"{sample_name}{_format_labels(dict(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Timing per tahap pipeline (detik)
+CAPTURE_WAIT = REGISTRY.histogram("yolo_capture_wait_seconds", "Time the producer waited for a new camera frame")
+INFERENCE_TIME = REGISTRY.histogram("yolo_inference_seconds", "Model call duration per batch")
+PLOT_TIME = REGISTRY.histogram("yolo_plot_seconds", "Box annotation (plot) duration per frame")
+ENCODE_TIME = REGISTRY.histogram("yolo_encode_seconds", "JPEG encode duration per output frame (passthrough excluded)")
+DB_WRITE_TIME = REGISTRY.histogram("yolo_db_write_seconds", "Detection batch insert duration")
+FRAME_AGE = REGISTRY.histogram("yolo_frame_age_seconds", "Age of output frames from capture to publish", ("device",))
+
+SKIPPED_INFERENCES = REGISTRY.counter("yolo_skipped_inferences_total", "Frames published without inference",
+                                      ("device", "reason"))
+DB_ERRORS = REGISTRY.counter("yolo_db_errors_total", "Failed detection batch writes")
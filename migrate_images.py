@@ -0,0 +1,42 @@
+"""
+Pindahkan snapshot lama dari kolom detections.image (LONGBLOB) ke image store.
+Diproses per batch (keyset by id) sehingga memori tetap kecil berapa pun jumlah barisnya.
+"""
+
+import argparse
+from database import get_detection_image_batch, set_detection_image_keys
+from image_store import put_image
+
+
+def migrate_images(batch_size=100, dry_run=False):
+    last_id = 0
+    migrated = 0
+    total_bytes = 0
+    while True:
+        # Dry run hanya membaca ukuran (LENGTH), bukan isi blob
+        rows = get_detection_image_batch(last_id, batch_size, sizes_only=dry_run)
+        if not rows:
+            break
+        pairs = []
+        for detection_id, image in rows:
+            if dry_run:
+                total_bytes += image
+            else:
+                pairs.append((detection_id, put_image(bytes(image))))
+                total_bytes += len(image)
+            last_id = detection_id
+        if not dry_run:
+            set_detection_image_keys(pairs)
+        migrated += len(rows)
+        print(f"Migrated {migrated} image(s) so far (last id {last_id})")
+    action = "Would migrate" if dry_run else "Successfully migrated"
+    print(f"\n{action} {migrated} image(s), {total_bytes / (1024 * 1024):.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move detection snapshots out of the LONGBLOB column")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="Only count rows and bytes, change nothing")
+    args = parser.parse_args()
+    print("Starting image migration...")
+    migrate_images(args.batch_size, args.dry_run)
@@ -0,0 +1,119 @@
+"""
+Pre-filter murah sebelum YOLO: frame differencing (atau background subtraction)
+pada frame yang diperkecil. Model hanya dipanggil jika ada gerakan atau
+keepalive berkala sudah jatuh tempo.
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfigurasi
+MOTION_GATE = os.getenv("MOTION_GATE", "false").lower() == "true"
+MOTION_METHOD = os.getenv("MOTION_METHOD", "diff").lower()  # diff | mog2
+MOTION_SCALE_WIDTH = int(os.getenv("MOTION_SCALE_WIDTH", "160"))  # px
+MOTION_THRESHOLD = int(os.getenv("MOTION_THRESHOLD", "25"))  # beda intensitas per pixel (0-255)
+MOTION_MIN_AREA = float(os.getenv("MOTION_MIN_AREA", "0.005"))  # fraksi pixel ROI yang berubah
+MOTION_KEEPALIVE = float(os.getenv("MOTION_KEEPALIVE", "10"))  # detik, inferensi paksa walau tanpa gerakan
+MOTION_HOLD = float(os.getenv("MOTION_HOLD", "2"))  # detik, tetap inferensi setelah gerakan terakhir
+MOTION_ROI = os.getenv("MOTION_ROI", "")  # "x1,y1,x2,y2;..." koordinat relatif 0-1, kosong = seluruh frame
+
+
+def parse_roi(value):
+    regions = []
+    for item in value.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        x1, y1, x2, y2 = (float(v) for v in item.split(","))
+        regions.append((x1, y1, x2, y2))
+    return regions
+
+
+class MotionGate:
+    def __init__(self, method=MOTION_METHOD, scale_width=MOTION_SCALE_WIDTH, threshold=MOTION_THRESHOLD,
+                 min_area=MOTION_MIN_AREA, keepalive=MOTION_KEEPALIVE, hold=MOTION_HOLD, roi=MOTION_ROI):
+        self.method = method
+        self.scale_width = scale_width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.keepalive = keepalive
+        self.hold = hold
+        self.regions = parse_roi(roi) if isinstance(roi, str) else list(roi or [])
+        self._prev = None
+        self._mask = None
+        self._subtractor = None
+        self._last_infer = 0.0
+        self._last_motion = 0.0
+        self.last_score = 0.0
+        self.frames = 0
+        self.inferred = 0
+
+    def _prepare(self, frame):
+        h, w = frame.shape[:2]
+        if w > self.scale_width:
+            frame = cv2.resize(frame, (self.scale_width, max(1, round(h * self.scale_width / w))),
+                               interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def _roi_mask(self, shape):
+        if self._mask is not None and self._mask.shape == shape:
+            return self._mask
+        if not self.regions:
+            self._mask = None
+            return None
+        h, w = shape
+        mask = np.zeros(shape, dtype=bool)
+        for x1, y1, x2, y2 in self.regions:
+            mask[int(y1 * h):int(y2 * h), int(x1 * w):int(x2 * w)] = True
+        self._mask = mask
+        return mask
+
+    def motion_score(self, frame):
+        """Fraksi pixel (di dalam ROI) yang berubah dibanding frame sebelumnya / background."""
+        small = self._prepare(frame)
+        if self.method == "mog2":
+            if self._subtractor is None:
+                self._subtractor = cv2.createBackgroundSubtractorMOG2(history=200, detectShadows=False)
+            changed = self._subtractor.apply(small) > 0
+        else:
+            if self._prev is None or self._prev.shape != small.shape:
+                self._prev = small
+                return 1.0
+            changed = cv2.absdiff(small, self._prev) > self.threshold
+            self._prev = small
+        mask = self._roi_mask(small.shape)
+        if mask is not None:
+            total = int(mask.sum())
+            return float(np.count_nonzero(changed & mask)) / total if total else 0.0
+        return float(np.count_nonzero(changed)) / changed.size
+
+    def should_infer(self, frame, now=None):
+        now = now if now is not None else time.time()
+        self.frames += 1
+        self.last_score = self.motion_score(frame)
+        if self.last_score >= self.min_area:
+            self._last_motion = now
+        run = (
+            now - self._last_motion <= self.hold
+            or now - self._last_infer >= self.keepalive
+        )
+        if run:
+            self._last_infer = now
+            self.inferred += 1
+        return run
+
+    def stats(self):
+        skipped = self.frames - self.inferred
+        return {
+            "frames": self.frames,
+            "inferred": self.inferred,
+            "skipped": skipped,
+            "skip_ratio": round(skipped / self.frames, 3) if self.frames else 0.0,
+            "last_score": round(self.last_score, 4),
+        }
@@ -0,0 +1,455 @@
+"""
+Pipeline deteksi: grabber per kamera -> inferensi YOLO (batch) -> FrameHub per device
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+import numpy as np
+from dotenv import load_dotenv
+from camera_capture import FrameGrabber
+from stream_hub import FrameHub
+from database import get_devices, clear_clip_keys
+from detection_writer import DetectionWriter
+from inference import predict, INFERENCE_IMGSZ
+from frame_encoder import FramePacket, encoder_stats
+from motion_gate import MotionGate, MOTION_GATE
+from adaptive_control import AdaptiveController, ADAPTIVE_CONTROL, STREAM_JPEG_QUALITY
+from tracker import IoUTracker
+from postprocess import PersonFilter
+from clip_recorder import ClipRecorder, CLIP_RECORDING
+from metrics import (REGISTRY, CAPTURE_WAIT, INFERENCE_TIME, PLOT_TIME, ENCODE_TIME, FRAME_AGE,
+                     SKIPPED_INFERENCES)
+
+load_dotenv()
+
+# Konfigurasi
+DEVICE_ID = int(os.getenv("DEVICE_ID", "1"))
+SKIP_RATE = int(os.getenv("SKIP_RATE", "5"))
+MAX_FPS = int(os.getenv("MAX_FPS", "10"))
+VIEWER_QUEUE_SIZE = int(os.getenv("VIEWER_QUEUE_SIZE", "2"))
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))  # per client SSE /events
+MULTI_CAMERA = os.getenv("MULTI_CAMERA", "false").lower() == "true"
+CAMERA_SOURCES = os.getenv("CAMERA_SOURCES", "")  # contoh: 1=http://10.0.0.11:81/stream,2=http://10.0.0.12:81/stream
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "thread").lower()  # thread | process (lihat workers.py)
+OVERLAY_MODE = os.getenv("OVERLAY_MODE", "server").lower()  # server: plot() di server | client: box dikirim via /events
+# track: satu baris per orang (tracker.py) | interval: maksimal satu baris per DB_INSERT_INTERVAL detik
+DETECTION_EVENTS = os.getenv("DETECTION_EVENTS", "track").lower()
+DB_INSERT_INTERVAL = 5  # detik
+
+logger = logging.getLogger(__name__)
+
+
+def parse_camera_sources(value):
+    """Parse "device_id=source,device_id=source" menjadi {device_id: source}"""
+    sources = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        device_id, _, source = item.partition("=")
+        sources[int(device_id)] = source.strip() or None
+    return sources
+
+
+def load_camera_sources():
+    """Daftar kamera: mode single memakai DEVICE_ID + konfigurasi camera_capture,
+    mode multi memakai CAMERA_SOURCES atau tabel devices."""
+    if not MULTI_CAMERA:
+        return {DEVICE_ID: None}
+    if CAMERA_SOURCES:
+        return parse_camera_sources(CAMERA_SOURCES)
+    try:
+        sources = {}
+        for device in get_devices():
+            if device.get("stream_url"):
+                sources[device["id"]] = device["stream_url"]
+            elif device.get("ip_address"):
+                sources[device["id"]] = f"http://{device['ip_address']}:81/stream"
+        if sources:
+            return sources
+        logger.warning("No cameras found in devices table, falling back to single camera")
+    except Exception as e:
+        logger.error(f"Failed to load cameras from database: {e}")
+    return {DEVICE_ID: None}
+
+
+class CameraStream:
+    """State per kamera: grabber, hub viewer, dan statistik delay/jitter."""
+
+    def __init__(self, device_id, source=None, frame_event=None, grabber=None):
+        self.device_id = device_id
+        self.grabber = grabber if grabber is not None else FrameGrabber(source, frame_event=frame_event)
+        self.hub = FrameHub(max_queue=VIEWER_QUEUE_SIZE)
+        self.motion = MotionGate() if MOTION_GATE else None
+        self.control = (AdaptiveController(SKIP_RATE, INFERENCE_IMGSZ, frame_interval_ms=1000.0 / MAX_FPS)
+                        if ADAPTIVE_CONTROL else None)
+        self.tracker = IoUTracker() if DETECTION_EVENTS == "track" else None
+        self.frame_id = 0
+        self.last_seq = 0
+        self.captured_at = None
+        self.last_delay = None
+        self.last_db_insert = 0
+        self.present_count = 0  # orang di depan kamera menurut tracker (event "tracks")
+
+    @property
+    def skip_rate(self):
+        return self.control.skip_rate if self.control else SKIP_RATE
+
+    @property
+    def imgsz(self):
+        return self.control.imgsz if self.control else INFERENCE_IMGSZ
+
+    @property
+    def jpeg_quality(self):
+        return self.control.jpeg_quality if self.control else STREAM_JPEG_QUALITY
+
+
+class DetectionPipeline:
+    """Satu producer untuk semua kamera. Frame dari kamera yang siap digabung
+    menjadi satu panggilan model(...) lalu hasilnya dirutekan ke device masing-masing."""
+
+    def __init__(self, model, person_class_ids, sources, writer=None, grabbers=None, frame_event=None):
+        """grabbers (opsional): {device_id: objek dengan antarmuka FrameGrabber}, dipakai
+        proses inferensi di mode process untuk membaca frame dari shared memory."""
+        self.set_model(model, person_class_ids)
+        # Event untuk dashboard (SSE): detection dari writer, health dari app
+        self.events = FrameHub(max_queue=EVENT_QUEUE_SIZE, name="Event client")
+        # Box OVERLAY_MODE=client (SSE /events/boxes): hub sendiri yang kecil seperti viewer video,
+        # hanya box terbaru yang berguna dan burst box tidak menggeser event deteksi
+        self.boxes = FrameHub(max_queue=VIEWER_QUEUE_SIZE, name="Box client")
+        self.writer = writer if writer is not None else DetectionWriter(on_flush=self._publish_detections)
+        # Klip pra/pasca-event (clip_recorder.py), None jika CLIP_RECORDING=false
+        self.clips = ClipRecorder(on_discard=clear_clip_keys) if CLIP_RECORDING else None
+        self.frame_event = frame_event if frame_event is not None else threading.Event()
+        grabbers = grabbers or {}
+        self.streams = {
+            device_id: CameraStream(device_id, source, self.frame_event, grabbers.get(device_id))
+            for device_id, source in sources.items()
+        }
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._state_lock = threading.Lock()
+        self._register_metrics()
+        logger.info(f"Pipeline cameras: {list(self.streams.keys())}")
+
+    def set_model(self, model, person_class_ids):
+        """Model boleh None saat startup (lihat startup.py): frame tetap di-stream tanpa deteksi."""
+        self.person_class_ids = person_class_ids
+        self.person_filter = PersonFilter(person_class_ids)
+        self.model = model
+
+    def _register_metrics(self):
+        REGISTRY.callback("yolo_camera_reconnects_total", "Camera reconnect attempts", "counter",
+                          lambda: {d: s.grabber.reconnects for d, s in self.streams.items()}, ("device",))
+        REGISTRY.callback("yolo_detection_events_dropped_total", "Detection events dropped because the writer queue was full",
+                          "counter", lambda: self.writer.stats()["dropped"])
+        REGISTRY.callback("yolo_writer_queue_depth", "Detection events waiting in the writer queue", "gauge",
+                          lambda: self.writer.stats()["queue_depth"])
+        if self.clips is not None:
+            REGISTRY.callback("yolo_clips_dropped_total", "Event clips dropped because the clip writer queue was full",
+                              "counter", lambda: self.clips.stats()["dropped"])
+
+    def start_grabbers(self):
+        self.writer.start()
+        if self.clips is not None:
+            self.clips.start()
+        for stream in self.streams.values():
+            stream.grabber.start()
+        return self
+
+    def shutdown(self):
+        # Hentikan producer dulu: setelah lock didapat, tidak ada iterasi yang masih
+        # mengubah tracker atau klip
+        self._stop.set()
+        self.frame_event.set()
+        with self._state_lock:
+            for stream in self.streams.values():
+                stream.grabber.stop()
+            if self.clips is not None:
+                # Klip ditulis dulu: key klip yang gagal tidak ikut disimpan di event track di bawah
+                self.clips.stop()
+            for stream in self.streams.values():
+                if stream.tracker is not None:
+                    # Orang yang masih terlihat tetap tercatat
+                    self._finish_tracks(stream, stream.tracker.flush())
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.writer.stop()
+
+    def ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self.start_grabbers()
+                self._thread = threading.Thread(target=self._run, name="frame-producer", daemon=True)
+                self._thread.start()
+                logger.info("Frame producer started")
+
+    def _publish_detections(self, events):
+        for e in events:
+            self.events.publish(("detection", {
+                "id": e.get("id"),
+                "device_id": e["device_id"],
+                "timestamp": e["timestamp"],
+                "status": e["status"],
+                "delay": e["delay"],
+                "jitter": e["jitter"],
+                "human_count": e["human_count"],
+                "peak_count": e.get("peak_count"),
+                "track_id": e.get("track_id"),
+                "ended_at": e.get("ended_at"),
+                "clip_key": e.get("clip_key"),
+            }))
+
+    def stream(self, device_id):
+        return self.streams.get(device_id)
+
+    def motion_stats(self):
+        return {device_id: s.motion.stats() for device_id, s in self.streams.items() if s.motion is not None}
+
+    def adaptive_state(self):
+        return {device_id: s.control.state() for device_id, s in self.streams.items() if s.control is not None}
+
+    def tracker_stats(self):
+        return {device_id: s.tracker.stats() for device_id, s in self.streams.items() if s.tracker is not None}
+
+    def present_counts(self):
+        """{device_id: jumlah orang yang sedang terlihat}, hanya untuk DETECTION_EVENTS=track."""
+        return {device_id: s.present_count for device_id, s in self.streams.items() if s.tracker is not None}
+
+    def writer_stats(self):
+        return self.writer.stats()
+
+    def clip_stats(self):
+        return self.clips.stats() if self.clips is not None else None
+
+    def encoder_stats(self):
+        return encoder_stats()
+
+    def worker_metrics(self):
+        # Semua metrik sudah ada di REGISTRY proses ini (lihat ProcessPipeline untuk mode process)
+        return []
+
+    def model_loaded(self):
+        return self.model is not None
+
+    def camera_status(self):
+        return {device_id: s.grabber.is_opened() for device_id, s in self.streams.items()}
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._loop()
+            except Exception as e:
+                logger.error(f"Producer crashed, restarting: {e}", exc_info=True)
+                time.sleep(1)
+
+    def _collect_ready(self):
+        ready = []
+        for stream in self.streams.values():
+            packet, captured_at, seq = stream.grabber.latest_packet()
+            if packet is not None and seq > stream.last_seq:
+                stream.last_seq = seq
+                stream.captured_at = captured_at
+                ready.append((stream, packet))
+        return ready
+
+    def _loop(self):
+        prev_time = time.time()
+        while not self._stop.is_set():
+            # Tunggu sampai minimal satu grabber punya frame baru
+            wait_start = time.perf_counter()
+            self.frame_event.wait(timeout=1.0)
+            self.frame_event.clear()
+            # State tracker/klip hanya diubah di bawah lock ini; shutdown() mengambilnya
+            # setelah producer diminta berhenti, jadi flush tidak pernah berjalan bersamaan
+            with self._state_lock:
+                if self._stop.is_set():
+                    return
+                ready = self._collect_ready()
+                self._expire_tracks()
+                if not ready:
+                    continue
+                CAPTURE_WAIT.observe(time.perf_counter() - wait_start)
+                loop_start = time.perf_counter()
+                self._process(ready)
+                # Lag producer untuk adaptive control: skip rate dinilai dari sini, bukan dari delay inferensi
+                loop_ms = (time.perf_counter() - loop_start) * 1000
+                for stream, _ in ready:
+                    if stream.control is not None:
+                        change = stream.control.observe_loop(loop_ms)
+                        if change:
+                            logger.info(f"Adaptive control device {stream.device_id}: {change}")
+
+            # Batasi FPS producer (berlaku untuk semua viewer sekaligus)
+            t_now = time.time()
+            elapsed = t_now - prev_time
+            if elapsed < 1.0 / MAX_FPS:
+                time.sleep((1.0 / MAX_FPS) - elapsed)
+            prev_time = time.time()
+
+    def _process(self, ready):
+        to_infer = []
+        for stream, packet in ready:
+            if self.model is None:
+                SKIPPED_INFERENCES.inc(device=stream.device_id, reason="loading")
+            elif stream.frame_id % stream.skip_rate != 0:
+                SKIPPED_INFERENCES.inc(device=stream.device_id, reason="skip_rate")
+            elif stream.motion is not None and not stream.motion.should_infer(packet.image):
+                SKIPPED_INFERENCES.inc(device=stream.device_id, reason="motion")
+            else:
+                to_infer.append((stream, packet))
+        outputs = {}
+        # Kamera dengan imgsz sama (lihat adaptive_control) digabung dalam satu batch
+        by_imgsz = {}
+        for stream, packet in to_infer:
+            by_imgsz.setdefault(stream.imgsz, []).append((stream, packet))
+        for imgsz, group in by_imgsz.items():
+            outputs.update(self._infer_batch(group, imgsz))
+
+        for stream, packet in ready:
+            output = outputs.get(stream.device_id, packet)
+            # Encode paling banyak sekali (JPEG kamera diteruskan jika tanpa anotasi),
+            # buffer yang sama dipakai snapshot database di _record
+            if output.has_jpeg:
+                jpeg = output.jpeg(stream.jpeg_quality)
+            else:
+                with ENCODE_TIME.time():
+                    jpeg = output.jpeg(stream.jpeg_quality)
+            stream.hub.publish((stream.frame_id, jpeg))
+            if self.clips is not None:
+                # Hanya referensi ke bytes yang sama, file klip ditulis thread clip-writer
+                self.clips.add_frame(stream.device_id, jpeg)
+            if stream.captured_at is not None:
+                FRAME_AGE.observe(time.time() - stream.captured_at, device=stream.device_id)
+            stream.frame_id += 1
+
+    def _infer_batch(self, to_infer, imgsz=INFERENCE_IMGSZ):
+        start_time = time.time()
+        results = predict(
+            self.model,
+            [packet.image for _, packet in to_infer],
+            classes=self.person_class_ids if self.person_class_ids else None,
+            imgsz=imgsz
+        )
+        # Delay & jitter untuk deteksi saja (satu batch = satu delay untuk semua frame di dalamnya)
+        delay = (time.time() - start_time) * 1000
+        INFERENCE_TIME.observe(delay / 1000)
+
+        outputs = {}
+        detections = [self.person_filter(r) for r in results]
+        for (stream, packet), r, dets in zip(to_infer, results, detections):
+            if OVERLAY_MODE == "client":
+                # Frame kamera dikirim apa adanya, box digambar browser di atas canvas
+                output = packet
+                self._publish_boxes(stream, packet, dets)
+            else:
+                # Tanpa box, frame asli (dan JPEG kameranya) dipakai apa adanya
+                output = self._plot(r) if len(r.boxes) > 0 else packet
+            outputs[stream.device_id] = output
+
+            # Deteksi memulai atau memperpanjang klip kamera ini; key-nya ikut disimpan di baris deteksi
+            clip_key = self.clips.trigger(stream.device_id) if self.clips is not None and dets.count else None
+            jitter = abs(delay - stream.last_delay) if stream.last_delay else 0
+            stream.last_delay = delay
+            if stream.control is not None:
+                change = stream.control.observe(delay, jitter)
+                if change:
+                    logger.info(f"Adaptive control device {stream.device_id}: {change}")
+            if stream.tracker is not None:
+                snapshot = None
+                if dets.count:
+                    # Frame dari shared memory (mode process) hanya valid selama iterasi ini
+                    retained = output.detach()
+                    if retained is not output and OVERLAY_MODE == "client":
+                        r.orig_img = retained.image
+                    snapshot = (retained, r, delay, jitter, clip_key)
+                finished = stream.tracker.update(dets.xyxy, dets.conf, snapshot=snapshot)
+                self._finish_tracks(stream, finished)
+                self._update_presence(stream, finished)
+            else:
+                self._record(stream, output, r, dets.detected, dets.count, delay, jitter, clip_key)
+        return outputs
+
+    def _expire_tracks(self):
+        # Track juga harus selesai saat tidak ada inferensi (skip rate, motion gate, kamera putus)
+        now = time.time()
+        for stream in self.streams.values():
+            if stream.tracker is not None and stream.tracker.tracks:
+                finished = stream.tracker.expire(now)
+                self._finish_tracks(stream, finished)
+                self._update_presence(stream, finished)
+
+    def _finish_tracks(self, stream, tracks):
+        """Satu baris per track: timestamp = masuk, ended_at = keluar, human_count = 1 (satu orang),
+        peak_count = jumlah orang terbanyak dalam satu frame selama track (tidak dijumlahkan rollup)."""
+        for track in tracks:
+            output, result, delay, jitter, clip_key = track.best_snapshot
+            if clip_key is not None and self.clips.is_discarded(clip_key):
+                clip_key = None
+            snapshot = self._snapshot(stream, output, result)
+            if self.writer.submit(stream.device_id, "HUMAN", jitter, delay, 1, snapshot,
+                                  timestamp=datetime.fromtimestamp(track.first_seen).replace(microsecond=0),
+                                  ended_at=datetime.fromtimestamp(track.last_seen).replace(microsecond=0),
+                                  track_id=track.track_id, peak_count=track.peak_count, clip_key=clip_key):
+                logger.info(f"Person track {track.track_id} at device {stream.device_id} ended after "
+                            f"{track.last_seen - track.first_seen:.1f}s, peak count={track.peak_count} [DB QUEUED]")
+
+    def _update_presence(self, stream, finished):
+        """Baris track baru ditulis saat orang keluar; event "tracks" memberi tahu dashboard
+        saat orang masuk atau keluar, dengan jumlah orang yang sedang terlihat."""
+        entered = stream.tracker.pop_entered()
+        count = stream.tracker.present_count
+        if not entered and not finished and count == stream.present_count:
+            return
+        stream.present_count = count
+        if entered:
+            # devices.last_status/last_active ikut diperbarui saat orang masuk, bukan hanya saat keluar
+            self.writer.submit_status(stream.device_id, "DETECTED")
+            for track in entered:
+                logger.info(f"Person track {track.track_id} at device {stream.device_id} entered, in view={count}")
+        self.events.publish(("tracks", {
+            "device_id": stream.device_id,
+            "human_count": count,
+            "entered": [{"track_id": t.track_id, "timestamp": datetime.fromtimestamp(t.first_seen).replace(microsecond=0)}
+                        for t in entered],
+            "exited": [t.track_id for t in finished],
+        }))
+
+    def _publish_boxes(self, stream, packet, dets):
+        h, w = packet.image.shape[:2]
+        boxes = np.column_stack([dets.xyxy / np.array([w, h, w, h], dtype=np.float32), dets.conf])
+        self.boxes.publish({
+            "device_id": stream.device_id,
+            "frame_id": stream.frame_id,
+            "width": w,
+            "height": h,
+            "count": dets.count,
+            "boxes": np.round(boxes, 4).tolist(),
+        })
+
+    def _record(self, stream, output, result, detected, human_count, delay, jitter, clip_key=None):
+        # Rate-limit ke database: jika deteksi, hanya insert jika sudah lewat DB_INSERT_INTERVAL detik
+        current_time = time.time()
+        device_id = stream.device_id
+        if detected and (current_time - stream.last_db_insert) > DB_INSERT_INTERVAL:
+            # Snapshot = bytes JPEG yang sama dengan frame stream; insert dilakukan writer di thread lain
+            snapshot = self._snapshot(stream, output, result)
+            if self.writer.submit(device_id, "HUMAN", jitter, delay, human_count, snapshot, clip_key=clip_key):
+                logger.info(f"Human detected at device {device_id}, count={human_count}, delay={delay:.1f}ms, jitter={jitter:.1f}ms [DB QUEUED]")
+            stream.last_db_insert = current_time
+        elif detected:
+            logger.info(f"Human detected at device {device_id}, skipping DB insert (interval < {DB_INSERT_INTERVAL} detik)")
+
+    def _snapshot(self, stream, output, result):
+        if OVERLAY_MODE == "client":
+            # Snapshot di database tetap dianotasi supaya box terlihat di tabel deteksi
+            output = self._plot(result)
+        return output.jpeg(stream.jpeg_quality)
+
+    def _plot(self, result):
+        with PLOT_TIME.time():
+            return FramePacket(image=result.plot())
@@ -0,0 +1,130 @@
+"""
+Post-processing hasil YOLO secara vektor: semua box satu frame diproses sebagai
+array NumPy (satu transfer tensor boxes.data), tanpa objek Boxes per box.
+
+    python postprocess.py bench     # micro-benchmark dibanding loop Boxes lama (butuh torch)
+"""
+
+import time
+import argparse
+from typing import NamedTuple
+import numpy as np
+
+
+class Detections(NamedTuple):
+    xyxy: np.ndarray   # (N, 4) box person
+    conf: np.ndarray   # (N,)
+    count: int
+    max_conf: float
+    detected: bool
+
+
+EMPTY = Detections(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), 0, 0.0, False)
+
+
+class PersonFilter:
+    """Mask kelas person dihitung sekali dari PERSON_CLASS_IDS, lalu dipakai
+    untuk setiap hasil. Tanpa class id, semua box dihitung (sama seperti sebelumnya)."""
+
+    def __init__(self, class_ids):
+        self.class_ids = sorted({int(c) for c in class_ids or []})
+        if self.class_ids:
+            # Satu slot ekstra (False) di akhir untuk class id di luar jangkauan
+            self._mask = np.zeros(max(self.class_ids) + 2, dtype=bool)
+            self._mask[self.class_ids] = True
+        else:
+            self._mask = None
+
+    def keep(self, cls):
+        """Boolean mask untuk array class id."""
+        if self._mask is None:
+            return np.ones(len(cls), dtype=bool)
+        return self._mask[np.minimum(cls.astype(np.intp), len(self._mask) - 1)]
+
+    def from_array(self, data):
+        """data: array (N, 6) berisi x1, y1, x2, y2, conf, cls (format boxes.data)."""
+        if len(data) == 0:
+            return EMPTY
+        kept = data[self.keep(data[:, 5])]
+        count = len(kept)
+        max_conf = float(kept[:, 4].max()) if count else 0.0
+        return Detections(kept[:, :4], kept[:, 4], count, max_conf, count > 0)
+
+    def __call__(self, result):
+        # Satu transfer tensor -> NumPy untuk xyxy, conf dan cls sekaligus
+        return self.from_array(_boxes_array(result))
+
+
+def _boxes_array(result):
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 6), dtype=np.float32)
+    return boxes.data.cpu().numpy()
+
+
+def _loop_baseline(result, names, class_ids):
+    # Cara lama di generate_frames(): dua loop Python atas objek Boxes ultralytics
+    detected = False
+    human_count = 0
+    if len(result.boxes) > 0:
+        for box in result.boxes:
+            cls = int(box.cls[0])
+            if names[cls].strip().lower() in ["person", "human"] or not class_ids:
+                detected = True
+        human_count += len([box for box in result.boxes if int(box.cls[0]) in class_ids or not class_ids])
+    return detected, human_count
+
+
+class _BenchResult:
+    __slots__ = ("boxes",)
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def bench(boxes_per_frame=None, repeat=2000, device="cpu"):
+    """Bandingkan loop Boxes lama dengan PersonFilter pada Boxes ultralytics asli
+    (tensor torch di device yang sama dengan model), termasuk transfer .cpu().numpy()."""
+    import torch
+    from ultralytics.engine.results import Boxes
+    from inference import DETECT_MAX_DET
+    if boxes_per_frame is None:
+        # predict() membatasi max_det, ukuran di atas itu tidak terjadi di pipeline
+        boxes_per_frame = sorted({0, 1, 3, DETECT_MAX_DET // 2, DETECT_MAX_DET})
+    names = {i: f"class{i}" for i in range(80)}
+    names[0] = "person"
+    class_ids = [0]
+    person = PersonFilter(class_ids)
+    generator = torch.Generator().manual_seed(0)
+    print(f"{'boxes':>6} {'loop us':>10} {'vector us':>10} {'speedup':>8}  (device={device})")
+    for n in boxes_per_frame:
+        data = torch.cat([
+            torch.rand(n, 4, generator=generator) * 640, torch.rand(n, 1, generator=generator),
+            torch.randint(0, 3, (n, 1), generator=generator).float(),
+        ], dim=1).to(device)
+        result = _BenchResult(Boxes(data, (640, 640)))
+        _loop_baseline(result, names, class_ids)
+        person(result)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            _loop_baseline(result, names, class_ids)
+        loop_us = (time.perf_counter() - start) / repeat * 1e6
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            person(result)
+        vec_us = (time.perf_counter() - start) / repeat * 1e6
+
+        print(f"{n:>6} {loop_us:>10.1f} {vec_us:>10.1f} {loop_us / vec_us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized YOLO post-processing")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("bench", help="Micro-benchmark post-processing vs the per-box Boxes loop")
+    b.add_argument("--repeat", type=int, default=2000)
+    b.add_argument("--device", default="cpu", help="Torch device for the box tensors (cpu, cuda, ...)")
+    b.add_argument("--boxes", type=int, nargs="+", help="Boxes per frame (default: 0..DETECT_MAX_DET)")
+    args = parser.parse_args()
+    bench(args.boxes, repeat=args.repeat, device=args.device)
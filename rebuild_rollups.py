@@ -0,0 +1,26 @@
+"""
+Hitung ulang atau verifikasi tabel rollup (detection_totals, detection_rollups)
+dari isi tabel detections.
+"""
+
+import sys
+import argparse
+from database import rebuild_rollups, verify_rollups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild or verify detection rollups")
+    parser.add_argument("--verify", action="store_true", help="Only compare rollups with detections, change nothing")
+    args = parser.parse_args()
+
+    if not args.verify:
+        print("Rebuilding rollups from detections...")
+        rebuild_rollups()
+
+    mismatches = verify_rollups()
+    for kind, device_id, bucket, expected, actual in mismatches:
+        print(f"MISMATCH {kind} device={device_id} bucket={bucket}: expected={expected} actual={actual}")
+    if mismatches:
+        print(f"\n{len(mismatches)} mismatch(es) found")
+        sys.exit(1)
+    print("\nRollups are consistent")
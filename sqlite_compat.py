@@ -0,0 +1,174 @@
+"""
+Stand-in SQLite untuk database.py (development, benchmark, uji tanpa MySQL).
+Meniru bagian API mysql.connector yang dipakai di project ini.
+"""
+
+import re
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    email VARCHAR(100),
+    full_name VARCHAR(100),
+    role VARCHAR(10) DEFAULT 'user',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_login TIMESTAMP NULL
+);
+
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_name VARCHAR(100) NOT NULL,
+    ip_address VARCHAR(50),
+    stream_url VARCHAR(255) NULL,
+    total_human_detection INT DEFAULT 0,
+    last_status VARCHAR(50),
+    last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_id INT NOT NULL,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(50),
+    jitter FLOAT,
+    delay_ms FLOAT,
+    human_count INT DEFAULT 0,
+    image BLOB NULL,
+    image_key CHAR(64) NULL,
+    ended_at TIMESTAMP NULL,
+    track_id INT NULL,
+    peak_count INT NULL,
+    clip_key VARCHAR(255) NULL,
+    FOREIGN KEY (device_id) REFERENCES devices(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_detections_device_time ON detections (device_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_detections_clip_key ON detections (clip_key);
+
+CREATE TABLE IF NOT EXISTS detection_totals (
+    device_id INT PRIMARY KEY,
+    total_detections BIGINT NOT NULL DEFAULT 0,
+    total_humans BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS detection_rollups (
+    device_id INT NOT NULL,
+    bucket_type VARCHAR(10) NOT NULL,
+    bucket_start DATETIME NOT NULL,
+    detections INT NOT NULL DEFAULT 0,
+    human_total BIGINT NOT NULL DEFAULT 0,
+    human_max INT NOT NULL DEFAULT 0,
+    delay_total DOUBLE NOT NULL DEFAULT 0,
+    jitter_total DOUBLE NOT NULL DEFAULT 0,
+    PRIMARY KEY (device_id, bucket_type, bucket_start)
+);
+
+INSERT OR IGNORE INTO devices (id, device_name, ip_address, total_human_detection, last_status)
+VALUES (1, 'ESP32-CAM', '127.0.0.1', 0, 'inactive');
+"""
+
+_NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+
+
+def translate(sql):
+    """Ubah dialek MySQL yang dipakai database.py ke SQLite."""
+    sql = sql.replace("%s", "?")
+    sql = _NOW.sub("datetime('now', 'localtime')", sql)
+    return sql
+
+
+class SQLiteCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cur = cursor
+        self._dictionary = dictionary
+        self._first_rowid = None
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return tuple(row) if row is not None else None
+        return dict(zip(row.keys(), row))
+
+    def execute(self, sql, params=()):
+        self._first_rowid = None
+        self._cur.execute(translate(sql), params or ())
+
+    def executemany(self, sql, seq_of_params):
+        self._first_rowid = None
+        self._cur.executemany(translate(sql), seq_of_params)
+        if sql.lstrip().upper().startswith("INSERT") and self._cur.rowcount > 0:
+            # Seperti mysql-connector: lastrowid setelah executemany INSERT adalah id baris pertama
+            last = self._cur.connection.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self._first_rowid = last - self._cur.rowcount + 1
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    def __iter__(self):
+        for row in self._cur:
+            yield self._row(row)
+
+    @property
+    def lastrowid(self):
+        return self._first_rowid if self._first_rowid is not None else self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def close(self):
+        self._cur.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        uri = path.startswith("file:")
+        if path == ":memory:":
+            # Shared cache supaya semua koneksi di pool melihat database yang sama
+            path, uri = "file:smbd_memdb?mode=memory&cache=shared", True
+        self._conn = sqlite3.connect(path, uri=uri, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._open = True
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def start_transaction(self):
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False):
+        if not self._open:
+            raise sqlite3.ProgrammingError("Connection closed")
+
+    def close(self):
+        self._open = False
+        self._conn.close()
+
+
+def connect(path):
+    return SQLiteConnection(path)
@@ -0,0 +1,110 @@
+"""
+Startup di background: import app.py tidak lagi memuat model atau membuka kamera.
+Server langsung bind port, lalu model dimuat dan kamera dibuka secara paralel
+di thread terpisah. Kesiapan dilaporkan di /health: loading / ready / degraded.
+
+PRELOAD_MODEL=true memuat model saat import (mis. gunicorn --preload) di proses
+induk, dibagi copy-on-write ke worker hasil fork; warmup tetap di worker.
+
+Thread kamera dan producer dimulai saat import, kecuali STARTUP_DEFER=true: di
+server pre-fork (gunicorn --preload) thread proses induk tidak ikut fork, jadi
+worker memulainya sendiri, dari hook post_fork atau request pertama. Setiap
+worker punya pipeline sendiri, jadi server harus berjalan dengan satu worker.
+"""
+
+import os
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfigurasi
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "false").lower() == "true"
+STARTUP_DEFER = os.getenv("STARTUP_DEFER", "false").lower() == "true"  # server pre-fork: mulai di worker
+STARTUP_CAMERA_GRACE = float(os.getenv("STARTUP_CAMERA_GRACE", "15"))  # detik sebelum kamera mati dianggap degraded
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    """load_model: fungsi pemuat model untuk pipeline di proses ini, atau None jika
+    model dimuat di tempat lain (mode process: proses inferensi)."""
+
+    def __init__(self, pipeline, load_model=None, warmup=None):
+        self.pipeline = pipeline
+        self._load_model = load_model
+        self._warmup = warmup  # dipanggil di background jika model sudah di-preload tanpa warmup
+        self.model_state = "loading"
+        self.model_error = None
+        self.model_load_seconds = None
+        self.started_at = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Mulai thread startup sekali per proses. Thread dari proses induk tidak
+        ikut saat fork, jadi worker gunicorn memulainya sendiri (post_fork atau request pertama)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.started_at = time.time()
+            # Grabber membuka kamera masing-masing di thread sendiri (paralel, dengan backoff);
+            # producer langsung jalan supaya deteksi dan klip tercatat walau belum ada viewer
+            self.pipeline.start_grabbers()
+            self.pipeline.ensure_running()
+            if self._load_model is not None:
+                threading.Thread(target=self._model_task, name="startup-model", daemon=True).start()
+            logger.info("Background startup started")
+
+    def _model_task(self):
+        start = time.time()
+        try:
+            if self.pipeline.model_loaded():
+                if self._warmup is not None:
+                    self._warmup(self.pipeline.model)
+            else:
+                from inference import person_class_ids
+                model = self._load_model()
+                self.pipeline.set_model(model, person_class_ids(model))
+        except Exception as e:
+            self.model_state = "failed"
+            self.model_error = str(e)
+            logger.error(f"Model load failed: {e}", exc_info=True)
+            return
+        self.model_load_seconds = round(time.time() - start, 2)
+        self.model_state = "loaded"
+        logger.info(f"Model ready after {self.model_load_seconds}s")
+
+    def model_status(self):
+        if self._load_model is None:
+            # Model dimuat proses lain, status hanya diketahui dari pipeline
+            return "loaded" if self.pipeline.model_loaded() else "loading"
+        return self.model_state
+
+    def readiness(self, cameras, db_ok):
+        """loading: model belum siap (atau kamera masih dalam masa tunggu awal),
+        ready: semua komponen siap, degraded: server jalan tetapi ada komponen bermasalah."""
+        model = self.model_status()
+        if model == "failed":
+            return "degraded"
+        in_grace = self.started_at is None or time.time() - self.started_at < STARTUP_CAMERA_GRACE
+        if model == "loading" or (in_grace and not all(cameras.values())):
+            return "loading"
+        if not all(cameras.values()) or not db_ok:
+            return "degraded"
+        return "ready"
+
+    def state(self):
+        return {
+            "model": self.model_status(),
+            "model_error": self.model_error,
+            "model_load_seconds": self.model_load_seconds,
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at else 0,
+            "preloaded": PRELOAD_MODEL,
+            "deferred": STARTUP_DEFER,
+        }
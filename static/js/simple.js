@@ -16,6 +16,10 @@
   async function refreshHealth(){
     const h = await getJSON('/health');
     if(!h) return;
+    applyHealth(h);
+  }
+
+  function applyHealth(h){
     $('#camera-status').textContent = 'Camera: ' + (h.camera||'-');
     $('#db-status').textContent = 'DB: ' + (h.database||'-');
     $('#model-status').textContent = 'Model: ' + (h.model||'-');
@@ -38,6 +42,10 @@
   async function refreshData(){
     const d = await getJSON('/data');
     if(!d) return;
+    applyData(d);
+  }
+
+  function applyData(d){
     const hc = document.getElementById('human-count');
     if(hc) hc.textContent = d.human_count ?? 0;
     const td = document.getElementById('total-detections');
@@ -60,8 +68,8 @@
           const tr = document.createElement('tr');
           const imgSrc = (item.id!=null)?`/detection_image/${item.id}`:'';
           tr.innerHTML = `
-            <td>${imgSrc?`<img src="${imgSrc}" alt="thumb" style="width:80px;height:auto;border-radius:4px;object-fit:cover;cursor:zoom-in;" />`:''}</td>
-            <td>${item.timestamp??'-'}</td>
+            <td>${imgSrc?`<img src="${imgSrc}?size=thumb" data-full="${imgSrc}" alt="thumb" style="width:80px;height:auto;border-radius:4px;object-fit:cover;cursor:zoom-in;" />`:''}</td>
+            <td>${item.timestamp??'-'}${(item.clip_key && item.id!=null)?` <a class="clip-link" href="/detection_clip/${item.id}" target="_blank" rel="noopener">${item.clip_key.endsWith('.mjpeg')?'unduh klip':'klip'}</a>`:''}</td>
             <td>${item.status??'-'}</td>
             <td>${fmt(item.delay??0)}</td>
             <td>${fmt(item.jitter??0)}</td>
@@ -89,11 +97,25 @@
     img.removeAttribute('src');
   }
 
-  // Delegate click on thumbnails in the detections table
+  // Klip: key disimpan sebelum file selesai ditulis, jadi cek dulu (404 = masih direkam atau dibuang)
+  function openClip(link){
+    fetch(link.href, {method: 'HEAD'}).then(r=>{
+      if(r.ok){
+        window.open(link.href, '_blank', 'noopener');
+      } else {
+        link.replaceWith(document.createTextNode(r.status === 404 ? ' klip tidak tersedia' : ' klip gagal dimuat'));
+      }
+    }).catch(()=>{ link.textContent = 'klip gagal dimuat'; });
+  }
+
+  // Delegate click on thumbnails and clip links in the detections table
   document.getElementById('detections-tbody')?.addEventListener('click', (e)=>{
     const t = e.target;
     if(t && t.tagName === 'IMG'){
-      openLightbox(t.getAttribute('src'));
+      openLightbox(t.dataset.full || t.getAttribute('src'));
+    } else if(t && t.classList && t.classList.contains('clip-link')){
+      e.preventDefault();
+      openClip(t);
     }
   });
 
@@ -106,10 +128,85 @@
     if(e.key === 'Escape') closeLightbox();
   });
 
+  // Mode overlay client: box dari server (koordinat relatif 0-1) digambar di canvas
+  // di atas stream, dan tetap terlihat sampai hasil inferensi berikutnya datang.
+  const overlay = document.getElementById('overlay');
+  const clientOverlay = overlay && overlay.dataset.mode === 'client';
+  let lastBoxes = null;
+
+  function drawBoxes(){
+    if(!overlay) return;
+    const w = overlay.clientWidth, h = overlay.clientHeight;
+    if(overlay.width !== w) overlay.width = w;
+    if(overlay.height !== h) overlay.height = h;
+    const ctx = overlay.getContext('2d');
+    ctx.clearRect(0, 0, w, h);
+    if(!lastBoxes) return;
+    ctx.lineWidth = 2;
+    ctx.strokeStyle = '#ef4444';
+    ctx.fillStyle = '#ef4444';
+    ctx.font = '12px system-ui, sans-serif';
+    lastBoxes.boxes.forEach(([x1, y1, x2, y2, conf])=>{
+      ctx.strokeRect(x1 * w, y1 * h, (x2 - x1) * w, (y2 - y1) * h);
+      ctx.fillText('person ' + conf.toFixed(2), x1 * w + 2, Math.max(12, y1 * h - 4));
+    });
+  }
+  window.addEventListener('resize', drawBoxes);
+
+  // Server-Sent Events: data didorong server saat ada deteksi / perubahan health.
+  // Polling hanya dipakai sebagai fallback jika /events tidak tersedia.
+  let state = null;
+  let pollTimers = [];
+
+  function startPolling(){
+    if(pollTimers.length) return;
+    refreshHealth();
+    refreshData();
+    pollTimers = [setInterval(refreshHealth, 5000), setInterval(refreshData, 2000)];
+  }
+
+  function stopPolling(){
+    pollTimers.forEach(clearInterval);
+    pollTimers = [];
+  }
+
+  function startEvents(){
+    if(!window.EventSource) return false;
+    const es = new EventSource('/events');
+    es.addEventListener('snapshot', (e)=>{
+      state = JSON.parse(e.data);
+      applyData(state);
+    });
+    es.addEventListener('detection', (e)=>{
+      if(!state) return;
+      const ev = JSON.parse(e.data);
+      state.total_detections = (state.total_detections||0) + 1;
+      // Baris track ditulis saat orangnya keluar: jumlah orang saat ini datang dari event 'tracks'
+      if(ev.track_id == null) state.human_count = ev.human_count;
+      state.recent_detections = [ev].concat(state.recent_detections||[]).slice(0, 10);
+      applyData(state);
+    });
+    es.addEventListener('tracks', (e)=>{
+      if(!state) return;
+      state.human_count = JSON.parse(e.data).human_count;
+      applyData(state);
+    });
+    es.addEventListener('health', (e)=> applyHealth(JSON.parse(e.data)));
+    if(clientOverlay){
+      // Stream box terpisah: box yang terlambat dibuang server tanpa menunda event deteksi
+      const boxes = new EventSource('/events/boxes');
+      boxes.addEventListener('boxes', (e)=>{
+        lastBoxes = JSON.parse(e.data);
+        drawBoxes();
+      });
+    }
+    // EventSource reconnect otomatis; selama terputus, kembali ke polling
+    es.onopen = stopPolling;
+    es.onerror = startPolling;
+    return true;
+  }
+
   // kick off
-  refreshHealth();
-  refreshData();
-  setInterval(refreshHealth, 5000);
-  setInterval(refreshData, 2000);
+  if(!startEvents()) startPolling();
   requestAnimationFrame(tickFps);
 })();
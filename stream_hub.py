@@ -0,0 +1,53 @@
+"""
+Fan-out frame dari satu producer ke banyak viewer /video_feed
+"""
+
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FrameHub:
+    """Satu producer, banyak subscriber. Tiap subscriber punya queue terbatas;
+    jika viewer lambat, frame paling lama dibuang supaya yang terbaru tetap masuk."""
+
+    def __init__(self, max_queue=2, name="Viewer"):
+        self.max_queue = max_queue
+        self.name = name
+        self.dropped = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(q)
+        logger.info(f"{self.name} subscribed ({self.viewer_count()} active)")
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+        logger.info(f"{self.name} unsubscribed ({self.viewer_count()} active)")
+
+    def viewer_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, item):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(item)
+                    break
+                except queue.Full:
+                    # Viewer ketinggalan: buang frame basi, sisakan yang terbaru
+                    try:
+                        q.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
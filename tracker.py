@@ -0,0 +1,176 @@
+"""
+Tracker multi-objek ringan (gaya IoU/ByteTrack) di atas box person: deteksi per
+frame digabung menjadi track, dan setiap track menghasilkan satu event (waktu
+masuk/keluar, jumlah orang puncak, snapshot terbaik) saat orangnya keluar.
+Track yang baru terkonfirmasi (orang masuk) diambil lewat pop_entered().
+"""
+
+import os
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Konfigurasi
+TRACK_HIGH_CONF = float(os.getenv("TRACK_HIGH_CONF", "0.5"))  # deteksi kuat, boleh membuat track baru
+TRACK_MATCH_IOU = float(os.getenv("TRACK_MATCH_IOU", "0.3"))
+TRACK_MIN_HITS = int(os.getenv("TRACK_MIN_HITS", "2"))  # inferensi berturut-turut sebelum track dianggap orang
+TRACK_MAX_MISSED = int(os.getenv("TRACK_MAX_MISSED", "5"))  # inferensi tanpa deteksi sebelum track selesai
+TRACK_MAX_AGE = float(os.getenv("TRACK_MAX_AGE", "30"))  # detik tanpa deteksi (mis. kamera putus)
+
+
+def iou_matrix(a, b):
+    """IoU setiap pasangan box xyxy: a (N,4) x b (M,4) -> (N,M)"""
+    a = a[:, None, :]
+    b = b[None, :, :]
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    __slots__ = ("track_id", "box", "first_seen", "last_seen", "hits", "missed",
+                 "confirmed", "peak_count", "best_conf", "best_snapshot")
+
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.first_seen = self.last_seen = now
+        self.hits = 1
+        self.missed = 0
+        self.confirmed = False
+        self.peak_count = 0
+        self.best_conf = -1.0
+        self.best_snapshot = None
+
+
+class IoUTracker:
+    def __init__(self, high_conf=TRACK_HIGH_CONF, match_iou=TRACK_MATCH_IOU, min_hits=TRACK_MIN_HITS,
+                 max_missed=TRACK_MAX_MISSED, max_age=TRACK_MAX_AGE):
+        self.high_conf = high_conf
+        self.match_iou = match_iou
+        self.min_hits = min_hits
+        self.max_missed = max_missed
+        self.max_age = max_age
+        self.tracks = []
+        self._next_id = 1
+        self.finished = 0
+        self._entered = []
+
+    @property
+    def active_count(self):
+        """Jumlah orang (track terkonfirmasi) yang terlihat di inferensi terakhir."""
+        return sum(1 for t in self.tracks if t.confirmed and t.missed == 0)
+
+    @property
+    def present_count(self):
+        """Jumlah orang di depan kamera: track terkonfirmasi yang belum selesai, termasuk
+        yang sesaat tidak terdeteksi (lebih stabil dari active_count untuk dashboard)."""
+        return sum(1 for t in self.tracks if t.confirmed)
+
+    def pop_entered(self):
+        """Track yang terkonfirmasi sejak panggilan terakhir (orang masuk)."""
+        entered, self._entered = self._entered, []
+        return entered
+
+    def _associate(self, track_idx, det_idx, boxes):
+        if not track_idx or len(det_idx) == 0:
+            return [], track_idx
+        ious = iou_matrix(np.array([self.tracks[i].box for i in track_idx]), boxes[det_idx])
+        matches = []
+        # Greedy: pasangan dengan IoU tertinggi dulu
+        while ious.size:
+            t, d = np.unravel_index(np.argmax(ious), ious.shape)
+            if ious[t, d] < self.match_iou:
+                break
+            matches.append((track_idx[t], det_idx[d]))
+            ious[t, :] = -1
+            ious[:, d] = -1
+        matched = {t for t, _ in matches}
+        return matches, [i for i in track_idx if i not in matched]
+
+    def update(self, boxes, confs, snapshot=None, now=None):
+        """Masukkan deteksi satu inferensi (boxes xyxy (N,4), confs (N,)).
+        snapshot disimpan di track jika confidence-nya yang terbaik sejauh ini.
+        Return list track terkonfirmasi yang selesai (orang keluar)."""
+        now = now if now is not None else time.time()
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        confs = np.asarray(confs, dtype=np.float32).reshape(-1)
+        high = confs >= self.high_conf
+
+        # Tahap 1: deteksi kuat ke semua track, tahap 2 (ByteTrack): deteksi lemah
+        # hanya melanjutkan track yang belum dapat pasangan, tidak membuat track baru
+        remaining = list(range(len(self.tracks)))
+        matches, remaining = self._associate(remaining, np.flatnonzero(high), boxes)
+        low_matches, remaining = self._associate(remaining, np.flatnonzero(~high), boxes)
+        matches += low_matches
+
+        matched_dets = set()
+        for t_idx, d_idx in matches:
+            track = self.tracks[t_idx]
+            track.box = boxes[d_idx]
+            track.last_seen = now
+            track.hits += 1
+            track.missed = 0
+            if track.hits >= self.min_hits and not track.confirmed:
+                track.confirmed = True
+                self._entered.append(track)
+            if confs[d_idx] > track.best_conf:
+                track.best_conf = float(confs[d_idx])
+                track.best_snapshot = snapshot
+            matched_dets.add(d_idx)
+        for t_idx in remaining:
+            self.tracks[t_idx].missed += 1
+
+        for d_idx in np.flatnonzero(high):
+            if d_idx in matched_dets:
+                continue
+            track = Track(self._next_id, boxes[d_idx], now)
+            track.confirmed = self.min_hits <= 1
+            if track.confirmed:
+                self._entered.append(track)
+            track.best_conf = float(confs[d_idx])
+            track.best_snapshot = snapshot
+            self._next_id += 1
+            self.tracks.append(track)
+
+        count = self.active_count
+        for track in self.tracks:
+            if track.confirmed and track.missed == 0:
+                track.peak_count = max(track.peak_count, count)
+        return self.expire(now)
+
+    def expire(self, now=None):
+        """Selesaikan track yang terlalu lama tidak terlihat. Return track terkonfirmasi yang selesai."""
+        now = now if now is not None else time.time()
+        done = []
+        alive = []
+        for track in self.tracks:
+            if track.missed >= self.max_missed or now - track.last_seen > self.max_age:
+                if track.confirmed:
+                    done.append(track)
+            else:
+                alive.append(track)
+        self.tracks = alive
+        self.finished += len(done)
+        return done
+
+    def flush(self):
+        """Selesaikan semua track (shutdown)."""
+        done = [t for t in self.tracks if t.confirmed]
+        self.tracks = []
+        self.finished += len(done)
+        return done
+
+    def stats(self):
+        return {
+            "active_tracks": self.active_count,
+            "tentative_tracks": sum(1 for t in self.tracks if not t.confirmed),
+            "tracks_started": self._next_id - 1,
+            "tracks_finished": self.finished,
+        }
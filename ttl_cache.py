@@ -0,0 +1,82 @@
+"""
+Cache in-process dengan TTL pendek dan single-flight: jika banyak request
+meminta key yang sama saat cache kosong, hanya satu yang memanggil loader,
+sisanya menunggu hasilnya.
+"""
+
+import time
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._data = {}        # key -> (expires_at, value)
+        self._inflight = {}    # key -> _Flight
+        self._generation = {}  # key -> counter, dinaikkan saat invalidate
+        self._global_generation = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    def _gen(self, key):
+        return (self._global_generation, self._generation.get(key, 0))
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._stats["hits"] += 1
+                return entry[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self._stats["misses"] += 1
+                generation = self._gen(key)
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                # Jangan simpan hasil yang sudah di-invalidate selama loader berjalan
+                if flight.error is None and generation == self._gen(key):
+                    self._data[key] = (time.time() + self.ttl, flight.value)
+            flight.event.set()
+        return flight.value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            self._stats["invalidations"] += 1
+            if key is None:
+                self._data.clear()
+                self._global_generation += 1
+            else:
+                self._data.pop(key, None)
+                self._generation[key] = self._generation.get(key, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._data)
+        stats["ttl"] = self.ttl
+        return stats
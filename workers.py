@@ -0,0 +1,485 @@
+"""
+Mode process (PIPELINE_MODE=process): capture dan inferensi berjalan di proses
+worker sendiri, terpisah dari proses Flask.
+
+    proses capture   -- ring buffer shared memory (view NumPy tanpa copy) -->  proses inferensi
+    proses inferensi -- results queue (frame JPEG, statistik; dibuang jika penuh) -->  proses Flask
+                     -- events queue (event deteksi; menunggu, tidak ikut dibuang) -->  proses Flask
+
+Proses Flask hanya meneruskan apa yang dipublikasikan worker ke FrameHub lokal,
+sehingga request (/data, /events, ...) tidak berebut GIL dengan capture dan YOLO.
+
+Kedua worker dibuat dan dijalankan ulang oleh proses supervisor. Supervisor di-fork
+sekali saat start, ketika proses Flask belum melayani request; fork berikutnya
+(restart worker yang crash) terjadi di supervisor yang hanya punya satu thread,
+bukan di proses Flask yang multithread. Butuh fork, jadi hanya Linux/macOS.
+"""
+
+import os
+import time
+import queue
+import signal
+import logging
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+from dotenv import load_dotenv
+from frame_encoder import FramePacket
+from stream_hub import FrameHub
+from metrics import REGISTRY
+
+load_dotenv()
+
+# Konfigurasi
+SHM_RING_SLOTS = max(3, int(os.getenv("SHM_RING_SLOTS", "4")))  # slot frame per kamera
+SHM_MAX_WIDTH = int(os.getenv("SHM_MAX_WIDTH", "1600"))  # resolusi maksimal frame kamera
+SHM_MAX_HEIGHT = int(os.getenv("SHM_MAX_HEIGHT", "1200"))
+SHM_MAX_JPEG = int(os.getenv("SHM_MAX_JPEG", str(1024 * 1024)))  # bytes, JPEG asli kamera (passthrough)
+RESULTS_QUEUE_SIZE = int(os.getenv("RESULTS_QUEUE_SIZE", "64"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "1000"))
+EVENT_PUT_TIMEOUT = 5.0  # detik, event menunggu proses Flask sebelum akhirnya dibuang
+WORKER_RESTART_INTERVAL = 1.0  # detik, supervisor memeriksa worker yang mati
+WORKER_STATS_INTERVAL = 1.0  # detik
+WORKER_SHUTDOWN_TIMEOUT = 10  # detik, termasuk flush writer deteksi
+
+PROCESS_MODE_AVAILABLE = "fork" in mp.get_all_start_methods()
+
+logger = logging.getLogger(__name__)
+
+# Header ring (int64)
+_LATEST_SLOT, _LATEST_SEQ, _HELD_SLOT, _OPENED, _RECONNECTS = range(5)
+_HEADER_LEN = 8
+# Metadata per slot (int64)
+_SEQ, _HEIGHT, _WIDTH, _JPEG_LEN = range(4)
+_META_LEN = 4
+
+
+class _ProcessEvent:
+    """Pengganti mp.Event untuk event yang dipakai worker. mp.Event.set() menunggu
+    setiap proses yang sedang wait() mengonfirmasi bangun, sehingga worker yang
+    di-kill saat wait() membuat set() menggantung selamanya. Di sini status berupa
+    satu byte shared memory dan wait() hanya memakai semaphore, yang tidak pernah
+    menunggu proses lain."""
+
+    def __init__(self, ctx):
+        self._flag = ctx.RawValue("b", 0)
+        self._wake = ctx.Semaphore(0)
+
+    def is_set(self):
+        return bool(self._flag.value)
+
+    def set(self):
+        self._flag.value = 1
+        self._wake.release()
+
+    def clear(self):
+        self._flag.value = 0
+        while self._wake.acquire(False):
+            pass
+
+    def wait(self, timeout=None):
+        if self._flag.value:
+            return True
+        if self._wake.acquire(timeout=timeout) and self._flag.value:
+            # Teruskan ke proses lain yang juga menunggu event ini
+            self._wake.release()
+        return bool(self._flag.value)
+
+
+class FrameRing:
+    """Ring buffer frame satu kamera di shared memory. Satu penulis (proses
+    capture) dan satu pembaca (proses inferensi). Pembaca mendapat view NumPy
+    langsung ke slot; slot yang sedang dipegang pembaca tidak akan ditimpa.
+    Lock hanya dipakai untuk metadata, bukan selama copy pixel."""
+
+    def __init__(self, ctx, slots=SHM_RING_SLOTS, max_width=SHM_MAX_WIDTH, max_height=SHM_MAX_HEIGHT,
+                 max_jpeg=SHM_MAX_JPEG):
+        self.slots = slots
+        self.frame_bytes = max_width * max_height * 3
+        self.max_jpeg = max_jpeg
+        header = _HEADER_LEN * 8
+        meta = slots * (_META_LEN * 8 + 8)
+        size = header + meta + slots * (self.frame_bytes + max_jpeg)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._lock = ctx.Lock()
+        self._map(header)
+        self._header[:] = 0
+        self._header[_LATEST_SLOT] = -1
+        self._header[_HELD_SLOT] = -1
+        self._meta[:] = 0
+
+    def _map(self, header_size):
+        buf = self._shm.buf
+        offset = 0
+        self._header = np.ndarray((_HEADER_LEN,), dtype=np.int64, buffer=buf, offset=offset)
+        offset += header_size
+        self._meta = np.ndarray((self.slots, _META_LEN), dtype=np.int64, buffer=buf, offset=offset)
+        offset += self.slots * _META_LEN * 8
+        self._timestamps = np.ndarray((self.slots,), dtype=np.float64, buffer=buf, offset=offset)
+        offset += self.slots * 8
+        self._frames = np.ndarray((self.slots, self.frame_bytes), dtype=np.uint8, buffer=buf, offset=offset)
+        offset += self.slots * self.frame_bytes
+        self._jpegs = np.ndarray((self.slots, self.max_jpeg), dtype=np.uint8, buffer=buf, offset=offset)
+
+    def write(self, image, jpeg=None, captured_at=None):
+        """Salin frame ke slot berikutnya. Return False jika frame lebih besar dari kapasitas slot."""
+        h, w = image.shape[:2]
+        if image.ndim != 3 or image.shape[2] != 3 or h * w * 3 > self.frame_bytes:
+            return False
+        jpeg_len = len(jpeg) if jpeg is not None and len(jpeg) <= self.max_jpeg else 0
+        with self._lock:
+            latest = int(self._header[_LATEST_SLOT])
+            held = int(self._header[_HELD_SLOT])
+            slot = next(s for s in ((latest + i) % self.slots for i in range(1, self.slots + 1))
+                        if s != held and s != latest)
+            self._meta[slot, _SEQ] = -1  # sedang ditulis
+        self._frames[slot, :h * w * 3].reshape(h, w, 3)[:] = image
+        if jpeg_len:
+            self._jpegs[slot, :jpeg_len] = np.frombuffer(jpeg, dtype=np.uint8)
+        with self._lock:
+            seq = int(self._header[_LATEST_SEQ]) + 1
+            self._meta[slot] = (seq, h, w, jpeg_len)
+            self._timestamps[slot] = captured_at if captured_at is not None else time.time()
+            self._header[_LATEST_SLOT] = slot
+            self._header[_LATEST_SEQ] = seq
+        return True
+
+    def read_latest(self, last_seq=0):
+        """Frame terbaru jika lebih baru dari last_seq: (image_view, jpeg, captured_at, seq).
+        View valid sampai read_latest berikutnya mengembalikan frame baru."""
+        with self._lock:
+            seq = int(self._header[_LATEST_SEQ])
+            if seq <= last_seq or self._header[_LATEST_SLOT] < 0:
+                return None
+            slot = int(self._header[_LATEST_SLOT])
+            self._header[_HELD_SLOT] = slot
+            _, h, w, jpeg_len = (int(v) for v in self._meta[slot])
+            captured_at = float(self._timestamps[slot])
+        image = self._frames[slot, :h * w * 3].reshape(h, w, 3)
+        jpeg = self._jpegs[slot, :jpeg_len].tobytes() if jpeg_len else None
+        return image, jpeg, captured_at, seq
+
+    def set_status(self, opened, reconnects):
+        self._header[_OPENED] = int(opened)
+        self._header[_RECONNECTS] = reconnects
+
+    @property
+    def opened(self):
+        return bool(self._header[_OPENED])
+
+    @property
+    def reconnects(self):
+        return int(self._header[_RECONNECTS])
+
+    def close(self, unlink=False):
+        # Lepaskan view NumPy dulu, SharedMemory.close() gagal jika buffer masih dipakai
+        self._header = self._meta = self._timestamps = self._frames = self._jpegs = None
+        try:
+            self._shm.close()
+            if unlink:
+                self._shm.unlink()
+        except (BufferError, FileNotFoundError) as e:
+            logger.warning(f"Shared memory cleanup failed: {e}")
+
+
+class SharedFramePacket(FramePacket):
+    """FramePacket yang pixel-nya view ke slot ring buffer."""
+
+    __slots__ = ()
+
+    def detach(self):
+        return FramePacket(image=self._image.copy(), jpeg=self._jpeg)
+
+
+class SharedFrameSource:
+    """Antarmuka FrameGrabber (latest_packet, is_opened, ...) di atas FrameRing,
+    dipakai DetectionPipeline di proses inferensi."""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self._packet = None
+        self._timestamp = None
+        self._seq = 0
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def is_opened(self):
+        return self.ring.opened
+
+    @property
+    def reconnects(self):
+        return self.ring.reconnects
+
+    def latest_packet(self):
+        frame = self.ring.read_latest(self._seq)
+        if frame is not None:
+            image, jpeg, self._timestamp, self._seq = frame
+            self._packet = SharedFramePacket(image=image, jpeg=jpeg)
+        return self._packet, self._timestamp, self._seq
+
+
+class _ResultsHub:
+    """Pengganti FrameHub di proses inferensi: setiap publish dikirim ke proses Flask.
+    timeout=0 membuang item jika queue penuh (frame), timeout>0 menunggu dulu (event)."""
+
+    def __init__(self, results, kind, device_id=None, timeout=0):
+        self.results = results
+        self.kind = kind
+        self.device_id = device_id
+        self.timeout = timeout
+        self.dropped = 0
+
+    def publish(self, item):
+        try:
+            if self.timeout:
+                self.results.put((self.kind, self.device_id, item), timeout=self.timeout)
+            else:
+                self.results.put_nowait((self.kind, self.device_id, item))
+        except queue.Full:
+            self.dropped += 1
+
+    def viewer_count(self):
+        return 0
+
+
+def _capture_main(sources, rings, frame_event, stop_event):
+    from camera_capture import FrameGrabber
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    local_event = threading.Event()
+    grabbers = {device_id: FrameGrabber(source, frame_event=local_event).start()
+                for device_id, source in sources.items()}
+    last_seq = {device_id: 0 for device_id in grabbers}
+    oversized = set()
+    while not stop_event.is_set():
+        local_event.wait(timeout=0.5)
+        local_event.clear()
+        wrote = False
+        for device_id, grabber in grabbers.items():
+            ring = rings[device_id]
+            ring.set_status(grabber.is_opened(), grabber.reconnects)
+            packet, captured_at, seq = grabber.latest_packet()
+            if packet is None or seq <= last_seq[device_id]:
+                continue
+            last_seq[device_id] = seq
+            image = packet.image
+            if image is None:
+                continue
+            jpeg = packet.jpeg() if packet.has_jpeg else None
+            if ring.write(image, jpeg, captured_at):
+                wrote = True
+            elif device_id not in oversized:
+                oversized.add(device_id)
+                logger.error(f"Frame {image.shape} from device {device_id} exceeds shared memory slot "
+                             f"({SHM_MAX_WIDTH}x{SHM_MAX_HEIGHT}), raise SHM_MAX_WIDTH/SHM_MAX_HEIGHT")
+        if wrote:
+            frame_event.set()
+    for grabber in grabbers.values():
+        grabber.stop()
+
+
+def _inference_main(sources, rings, frame_event, results, events, stop_event):
+    from inference import load_model, person_class_ids
+    from pipeline import DetectionPipeline
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    model = load_model()
+    grabbers = {device_id: SharedFrameSource(ring) for device_id, ring in rings.items()}
+    pipeline = DetectionPipeline(model, person_class_ids(model), sources, grabbers=grabbers, frame_event=frame_event)
+    # Frame output dan event dikirim ke proses Flask, bukan ke viewer lokal
+    for device_id, stream in pipeline.streams.items():
+        stream.hub = _ResultsHub(results, "frame", device_id)
+    # Event deteksi punya queue sendiri: burst frame tidak bisa menggesernya
+    pipeline.events = _ResultsHub(events, "event", timeout=EVENT_PUT_TIMEOUT)
+    # Box overlay client seperti frame: dibuang jika queue penuh, yang berikutnya menggantikan
+    pipeline.boxes = _ResultsHub(results, "boxes")
+    pipeline.ensure_running()
+
+    while not stop_event.wait(WORKER_STATS_INTERVAL):
+        try:
+            results.put_nowait(("stats", None, {
+                "model_loaded": True,
+                "cameras": pipeline.camera_status(),
+                "motion": pipeline.motion_stats(),
+                "adaptive": pipeline.adaptive_state(),
+                "tracking": pipeline.tracker_stats(),
+                "writer": pipeline.writer_stats(),
+                "clips": pipeline.clip_stats(),
+                "encoder": pipeline.encoder_stats(),
+                "dropped_results": (sum(s.hub.dropped for s in pipeline.streams.values()) + pipeline.events.dropped
+                                    + pipeline.boxes.dropped),
+                "metrics": REGISTRY.collect(),
+            }))
+        except queue.Full:
+            pass
+    pipeline.shutdown()
+
+
+def _supervisor_main(workers, stop_event):
+    """Jalankan worker dan jalankan ulang yang mati sampai stop_event di-set.
+    workers: [(name, target, args)]."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Metrik warisan proses Flask tidak boleh ikut dikirim balik oleh worker
+    REGISTRY.reset_after_fork()
+    ctx = mp.get_context("fork")
+    parent = os.getppid()
+    procs = {}
+    while not stop_event.is_set():
+        if os.getppid() != parent:
+            # Proses Flask mati tanpa shutdown (mis. SIGKILL): hentikan worker juga
+            logger.warning("Flask process is gone, stopping workers")
+            stop_event.set()
+            break
+        for name, target, args in workers:
+            proc = procs.get(name)
+            if proc is not None and proc.is_alive():
+                continue
+            if proc is not None:
+                logger.error(f"{name} worker exited with code {proc.exitcode}, restarting")
+            proc = procs[name] = ctx.Process(target=target, args=args, name=name, daemon=True)
+            proc.start()
+            logger.info(f"Started {name} worker (pid {proc.pid})")
+        stop_event.wait(WORKER_RESTART_INTERVAL)
+    for proc in procs.values():
+        proc.join(timeout=WORKER_SHUTDOWN_TIMEOUT)
+        if proc.is_alive():
+            logger.warning(f"{proc.name} worker did not stop, terminating")
+            proc.terminate()
+
+
+class _RemoteStream:
+    def __init__(self, device_id, max_queue):
+        self.device_id = device_id
+        self.hub = FrameHub(max_queue=max_queue)
+
+
+class ProcessPipeline:
+    """Pengganti DetectionPipeline di proses Flask untuk PIPELINE_MODE=process.
+    Antarmukanya sama (streams, events, stream(), *_stats(), ...), tetapi semua
+    data berasal dari proses worker."""
+
+    def __init__(self, sources):
+        from pipeline import VIEWER_QUEUE_SIZE, EVENT_QUEUE_SIZE, DETECTION_EVENTS
+        self.sources = sources
+        self._ctx = mp.get_context("fork")
+        self.rings = {device_id: FrameRing(self._ctx) for device_id in sources}
+        self.streams = {device_id: _RemoteStream(device_id, VIEWER_QUEUE_SIZE) for device_id in sources}
+        self.events = FrameHub(max_queue=EVENT_QUEUE_SIZE, name="Event client")
+        self.boxes = FrameHub(max_queue=VIEWER_QUEUE_SIZE, name="Box client")
+        self._frame_event = _ProcessEvent(self._ctx)
+        self._stop_event = _ProcessEvent(self._ctx)
+        self._results = self._ctx.Queue(maxsize=RESULTS_QUEUE_SIZE)
+        self._events = self._ctx.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self._stats = {}
+        # Jumlah orang terlihat per kamera, dari event "tracks" proses inferensi
+        self._present = {device_id: 0 for device_id in sources} if DETECTION_EVENTS == "track" else {}
+        self._supervisor = None
+        self._supervisor_lost = False
+        self._readers = []
+        self._lock = threading.Lock()
+
+    def start_grabbers(self):
+        with self._lock:
+            if self._supervisor is None:
+                # Supervisor bukan daemon karena harus bisa membuat proses anak;
+                # ia berhenti sendiri lewat stop_event atau saat proses ini hilang
+                workers = [
+                    ("capture", _capture_main, (self.sources, self.rings, self._frame_event, self._stop_event)),
+                    ("inference", _inference_main,
+                     (self.sources, self.rings, self._frame_event, self._results, self._events, self._stop_event)),
+                ]
+                self._supervisor = self._ctx.Process(target=_supervisor_main, args=(workers, self._stop_event),
+                                                     name="worker-supervisor")
+                self._supervisor.start()
+                logger.info(f"Started worker supervisor (pid {self._supervisor.pid})")
+                # Didaftarkan setelah fork; qsize() tidak tersedia di macOS, metrik yang gagal dilewati saat scrape
+                REGISTRY.callback("yolo_results_queue_depth", "Worker results waiting for the Flask process", "gauge",
+                                  lambda: {"results": self._results.qsize(), "events": self._events.qsize()}, ("queue",))
+            if not self._readers:
+                for source, name in ((self._results, "worker-results"), (self._events, "worker-events")):
+                    reader = threading.Thread(target=self._read_results, args=(source,), name=name, daemon=True)
+                    reader.start()
+                    self._readers.append(reader)
+        return self
+
+    def ensure_running(self):
+        # Worker yang crash dijalankan ulang oleh supervisor; proses ini tidak pernah fork
+        # lagi setelah start karena sudah punya thread request
+        if self._supervisor is None or self._supervisor_lost or self._stop_event.is_set():
+            return
+        if not self._supervisor.is_alive():
+            self._supervisor_lost = True
+            logger.error(f"Worker supervisor exited with code {self._supervisor.exitcode}, restart the server")
+
+    def shutdown(self):
+        self._stop_event.set()
+        if self._supervisor is not None:
+            self._supervisor.join(timeout=WORKER_SHUTDOWN_TIMEOUT + 5)
+            if self._supervisor.is_alive():
+                logger.warning("Worker supervisor did not stop, terminating")
+                self._supervisor.terminate()
+        for ring in self.rings.values():
+            ring.close(unlink=True)
+
+    def _read_results(self, source):
+        from database import dashboard_cache
+        while not self._stop_event.is_set():
+            try:
+                kind, device_id, item = source.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if kind == "frame":
+                stream = self.streams.get(device_id)
+                if stream is not None:
+                    stream.hub.publish(item)
+            elif kind == "event":
+                if item[0] == "detection":
+                    # Insert terjadi di proses inferensi, cache proses ini ikut di-invalidate
+                    dashboard_cache.invalidate(item[1]["device_id"])
+                elif item[0] == "tracks":
+                    self._present[item[1]["device_id"]] = item[1]["human_count"]
+                self.events.publish(item)
+            elif kind == "boxes":
+                self.boxes.publish(item)
+            elif kind == "stats":
+                self._stats = item
+
+    def stream(self, device_id):
+        return self.streams.get(device_id)
+
+    def model_loaded(self):
+        return self._stats.get("model_loaded", False)
+
+    def camera_status(self):
+        return {device_id: ring.opened for device_id, ring in self.rings.items()}
+
+    def motion_stats(self):
+        return self._stats.get("motion", {})
+
+    def adaptive_state(self):
+        return self._stats.get("adaptive", {})
+
+    def tracker_stats(self):
+        return self._stats.get("tracking", {})
+
+    def present_counts(self):
+        return dict(self._present)
+
+    def writer_stats(self):
+        return self._stats.get("writer", {})
+
+    def clip_stats(self):
+        return self._stats.get("clips")
+
+    def worker_metrics(self):
+        return self._stats.get("metrics", [])
+
+    def encoder_stats(self):
+        stats = dict(self._stats.get("encoder", {}))
+        stats["dropped_results"] = self._stats.get("dropped_results", 0)
+        return stats